@@ -81,5 +81,6 @@ class Language(BaseLanguage):
     ASK_TO_ADD             = 30077
     GROUP_ORDER            = 30078
     NO_FREE_IPTV           = 30079
+    MERGE_WORKERS          = 30080
 
 _ = Language()
\ No newline at end of file
@@ -2,6 +2,7 @@ import os
 import shutil
 import time
 import json
+import hashlib
 import codecs
 import re
 import xml.parsers.expat
@@ -11,7 +12,7 @@ import peewee
 from kodi_six import xbmc, xbmcvfs
 from six.moves.urllib.parse import unquote
 
-from slyguy import settings, database, gui, router
+from slyguy import settings, database, gui, router, concurrency
 from slyguy.log import log
 from slyguy.util import remove_file, hash_6, FileIO, gzip_extract, xz_extract
 from slyguy.session import Session
@@ -19,7 +20,7 @@ from slyguy.constants import ADDON_PROFILE, CHUNK_SIZE
 from slyguy.exceptions import Error
 
 from .constants import *
-from .models import Source, Playlist, EPG, Channel, merge_info, get_integrations
+from .models import Source, Playlist, EPG, Channel, ChannelSearch, merge_info, get_integrations
 from .language import _
 
 def copy_partial_data(file_path, _out, start_index, end_index):
@@ -121,6 +122,55 @@ class XMLParser(object):
         self._out.flush()
         epg.end_index = self._out.tell()
 
+class SourceFetcher(object):
+    """Downloads / extracts sources on the shared worker pool.
+
+    Each source gets its own temp file. Results are handed back in source order so
+    parsing and db inserts (and therefore the merged output) keep the same order.
+    At most `workers` fetched sources wait on disk for the parser at any time.
+    """
+    def __init__(self, process, method_name, tmp_file, workers=4):
+        self._process     = process
+        self._method_name = method_name
+        self._tmp_file    = tmp_file
+        self._workers     = max(1, workers)
+        self._jobs        = []
+        self._submitted   = 0
+        self._done        = 0
+
+    def start(self, sources):
+        for index, (source, state) in enumerate(sources):
+            self._jobs.append({'source': source, 'state': state, 'file_path': '{}_{}'.format(self._tmp_file, index), 'future': None})
+
+        log.debug('Fetching %s sources (%s at a time)', len(self._jobs), self._workers)
+        self._submit()
+
+    def _submit(self):
+        while self._submitted < len(self._jobs) and self._submitted - self._done < self._workers:
+            job = self._jobs[self._submitted]
+            job['future'] = concurrency.submit(self._process, job['source'], self._method_name, job['file_path'], job['state'])
+            self._submitted += 1
+
+    def result(self, index):
+        job = self._jobs[index]
+        changed, state = job['future'].result()
+        return changed, state, job['file_path']
+
+    def done(self, index):
+        remove_file(self._jobs[index]['file_path'])
+        self._done += 1
+        self._submit()
+
+    def close(self):
+        for job in self._jobs:
+            future = job['future']
+            if future and not future.cancel():
+                # still running. wait for it before removing its file
+                try: future.exception()
+                except: pass
+
+            remove_file(job['file_path'])
+
 class Merger(object):
     def __init__(self, output_path=None, forced=False):
         self.output_path = output_path or xbmc.translatePath(settings.get('output_dir', '').strip() or ADDON_PROFILE)
@@ -132,15 +182,55 @@ class Merger(object):
         self.integrations = get_integrations()
         self._playlist_epgs = []
 
+    def _fetcher(self, method_name, sources):
+        fetcher = SourceFetcher(self._process_source, method_name, self.tmp_file, workers=settings.getInt('merge_workers', 4))
+        fetcher.start(sources)
+        return fetcher
+
     def _call_addon_method(self, plugin_url):
         dirs, files = xbmcvfs.listdir(plugin_url)
         msg = unquote(files[0])
         if msg != 'ok':
             raise AddonError(msg)
 
-    def _process_source(self, source, method_name, file_path):
+    def _state_key(self, source, method_name):
+        return 'merge.{}.{}'.format(method_name, hash_6(source.path.strip().lower()))
+
+    def _get_state(self, source, method_name):
+        if self.forced:
+            return None
+
+        try:
+            return json.loads(database.KeyStore.get(database.KeyStore.key == self._state_key(source, method_name)).value)
+        except database.KeyStore.DoesNotExist:
+            return None
+        except Exception as e:
+            log.exception(e)
+            return None
+
+    def _set_state(self, source, method_name, state):
+        database.KeyStore.set(key=self._state_key(source, method_name), value=json.dumps(state))
+
+    def _source_settings(self, source):
+        fields = [source.source_type, source.archive_type, source.path]
+
+        if isinstance(source, Playlist):
+            fields.extend([source.skip_playlist_chno, source.use_start_chno, source.start_chno, source.default_visible, source.skip_playlist_groups, source.group_name])
+
+        return hash_6(fields)
+
+    def _process_source(self, source, method_name, file_path, state=None):
+        """Fetches a source into file_path.
+
+        Returns (changed, new_state). If the passed state shows the source is unchanged,
+        changed is False and file_path may not have been written.
+        """
         remove_file(file_path)
 
+        new_state = {'settings': self._source_settings(source)}
+        if not state or state.get('settings') != new_state['settings']:
+            state = {}
+
         path         = source.path.strip()
         source_type  = source.source_type
         archive_type = source.archive_type
@@ -165,7 +255,7 @@ class Merger(object):
             path = path.strip()
             if path.lower().startswith('plugin'):
                 self._call_addon_method(path)
-                return
+                return self._check_hash(file_path, state, new_state)
 
             if path.lower().startswith('http'):
                 source_type = Source.TYPE_URL
@@ -181,11 +271,32 @@ class Merger(object):
             archive_type = archive_extensions.get(ext, Source.ARCHIVE_NONE)
 
         if source_type == Source.TYPE_URL and path.lower().startswith('http'):
+            headers = {}
+            if state.get('url') == path:
+                if state.get('etag'):
+                    headers['If-None-Match'] = state['etag']
+                if state.get('last_modified'):
+                    headers['If-Modified-Since'] = state['last_modified']
+
             log.debug('Downloading: {} > {}'.format(path, file_path))
-            Session().chunked_dl(path, file_path)
+            resp = Session().chunked_dl(path, file_path, headers=headers)
+            if resp.status_code == 304:
+                log.debug('Not modified: %s', path)
+                return False, state
+
+            new_state.update({'url': path, 'etag': resp.headers.get('etag'), 'last_modified': resp.headers.get('last-modified')})
+
         elif not xbmcvfs.exists(path):
             raise Error(_(_.LOCAL_PATH_MISSING, path=path))
+
         else:
+            stat = xbmcvfs.Stat(path)
+            new_state.update({'file': path, 'mtime': stat.st_mtime(), 'size': stat.st_size()})
+
+            if all(state.get(key) == new_state[key] for key in ('file', 'mtime', 'size')):
+                log.debug('Local file unchanged: %s', path)
+                return False, state
+
             log.debug('Copying local file: {} > {}'.format(path, file_path))
             xbmcvfs.copy(path, file_path)
 
@@ -194,6 +305,30 @@ class Merger(object):
         elif archive_type == Source.ARCHIVE_XZ:
             xz_extract(file_path)
 
+        return self._check_hash(file_path, state, new_state)
+
+    def _file_hash(self, file_path):
+        ## per merge temp file so hashed directly (util.md5sum would cache the throwaway path)
+        h = hashlib.md5()
+
+        try:
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    h.update(chunk)
+        except (IOError, OSError):
+            return None
+
+        return h.hexdigest()
+
+    def _check_hash(self, file_path, state, new_state):
+        new_state['hash'] = self._file_hash(file_path)
+
+        if new_state['hash'] and state.get('hash') == new_state['hash']:
+            log.debug('Content unchanged: %s', file_path)
+            return False, dict(state, **new_state)
+
+        return True, new_state
+
     def _process_playlist(self, playlist, file_path):
         channel     = None
         to_create   = set()
@@ -309,12 +444,15 @@ class Merger(object):
         to_create.clear()
         slugs.clear()
 
+        ChannelSearch.index(playlist=playlist)
+
         return added_count
 
     def playlists(self):
         start_time = time.time()
         playlist_path = os.path.join(self.output_path, PLAYLIST_FILE_NAME)
         database.connect()
+        fetcher = None
 
         try:
             progress = gui.progressbg() if self.forced else None
@@ -323,6 +461,20 @@ class Merger(object):
             Playlist.update({Playlist.results: []}).where(Playlist.enabled == False).execute()
             Channel.delete().where(Channel.custom == False, Channel.playlist.not_in(playlists)).execute()
 
+            sources = []
+            for playlist in playlists:
+                if playlist.source_type == Playlist.TYPE_CUSTOM:
+                    continue
+
+                state = self._get_state(playlist, METHOD_PLAYLIST)
+                if state and playlist.channels.count() != state.get('rows'):
+                    state = None
+
+                sources.append([playlist, state])
+
+            fetcher = self._fetcher(METHOD_PLAYLIST, sources)
+            fetch_index = 0
+
             for count, playlist in enumerate(playlists):
                 count += 1
 
@@ -335,14 +487,27 @@ class Merger(object):
                     log.debug('Processing: {}'.format(playlist.path))
 
                     if playlist.source_type != Playlist.TYPE_CUSTOM:
-                        self._process_source(playlist, METHOD_PLAYLIST, self.tmp_file)
-
-                        with database.db.atomic() as transaction:
-                            try:
-                                added = self._process_playlist(playlist, self.tmp_file)
-                            except:
-                                transaction.rollback()
-                                raise
+                        changed, state, file_path = fetcher.result(fetch_index)
+
+                        if changed:
+                            epg_count = len(self._playlist_epgs)
+
+                            with database.db.atomic() as transaction:
+                                try:
+                                    added = self._process_playlist(playlist, file_path)
+                                except:
+                                    transaction.rollback()
+                                    raise
+
+                            state['count'] = added
+                            state['rows'] = playlist.channels.count()
+                            state['epgs'] = self._playlist_epgs[epg_count:]
+                        else:
+                            added = state['count']
+                            self._playlist_epgs.extend(state.get('epgs', []))
+                            log.debug('Playlist unchanged. Keeping %s channels', added)
+
+                        self._set_state(playlist, METHOD_PLAYLIST, state)
                     else:
                         added = len(playlist.channels)
                 except AddonError as e:
@@ -364,7 +529,9 @@ class Merger(object):
                     else:
                         playlist.results.insert(0, result)
 
-                remove_file(self.tmp_file)
+                if playlist.source_type != Playlist.TYPE_CUSTOM:
+                    fetcher.done(fetch_index)
+                    fetch_index += 1
 
                 playlist.results = playlist.results[:3]
                 playlist.save()
@@ -418,6 +585,7 @@ class Merger(object):
             Playlist.after_merge()
         finally:
             if progress: progress.close()
+            if fetcher: fetcher.close()
             database.close()
 
         log.debug('Playlist Merge Time: {0:.2f}'.format(time.time() - start_time))
@@ -429,6 +597,7 @@ class Merger(object):
         epg_path   = os.path.join(self.output_path, EPG_FILE_NAME)
         epg_path_tmp = os.path.join(self.output_path, EPG_FILE_NAME+'_tmp')
         database.connect()
+        fetcher = None
 
         try:
             progress = gui.progressbg() if self.forced else None
@@ -445,6 +614,8 @@ class Merger(object):
                         epgs.append(epg)
                         epg_urls.append(url.lower())
 
+            fetcher = self._fetcher(METHOD_EPG, [[epg, self._get_state(epg, METHOD_EPG) if epg.start_index > 0 else None] for epg in epgs])
+
             with FileIO(epg_path_tmp, 'wb') as _out:
                 _out.write(b'<?xml version="1.0" encoding="UTF-8"?><tv>')
 
@@ -458,15 +629,31 @@ class Merger(object):
                     epg_start = time.time()
                     try:
                         log.debug('Processing: {}'.format(epg.path))
-                        self._process_source(epg, METHOD_EPG, self.tmp_file)
-                        with FileIO(self.tmp_file, 'rb') as _in:
-                            parser = XMLParser(_out)
-                            parser.parse(_in, epg)
+
+                        changed, state, file_path = fetcher.result(count-1)
+
+                        if not changed and copy_partial_data(epg_path, _out, epg.start_index, epg.end_index):
+                            log.debug('EPG unchanged. Last used XML data loaded successfully')
+                            epg.start_index = file_index
+                            epg.end_index = _out.tell()
+                            programme_count = state['count']
+                        else:
+                            if not changed:
+                                _seek_file(_out, file_index)
+                                changed, state = self._process_source(epg, METHOD_EPG, file_path)
+
+                            with FileIO(file_path, 'rb') as _in:
+                                parser = XMLParser(_out)
+                                parser.parse(_in, epg)
+
+                            programme_count = state['count'] = parser.programme_count
+
+                        self._set_state(epg, METHOD_EPG, state)
                     except Exception as e:
                         log.exception(e)
                         result = [int(time.time()), EPG.ERROR, str(e)]
                     else:
-                        result = [int(time.time()), EPG.OK, '{} Programmes ({:.2f}s)'.format(parser.programme_count, time.time() - epg_start)]
+                        result = [int(time.time()), EPG.OK, '{} Programmes ({:.2f}s)'.format(programme_count, time.time() - epg_start)]
                         epg.results.insert(0, result)
 
                     if result[1] == EPG.ERROR:
@@ -491,7 +678,7 @@ class Merger(object):
                     epg.results = epg.results[:3]
                     if epg.id:
                         epg.save()
-                    remove_file(self.tmp_file)
+                    fetcher.done(count-1)
 
                 _out.write(b'</tv>')
 
@@ -499,8 +686,8 @@ class Merger(object):
             shutil.move(epg_path_tmp, epg_path)
         finally:
             if progress: progress.close()
+            if fetcher: fetcher.close()
 
-            remove_file(self.tmp_file)
             remove_file(epg_path_tmp)
             database.close()
 
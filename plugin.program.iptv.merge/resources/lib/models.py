@@ -422,6 +422,7 @@ class Playlist(Source):
     @classmethod
     def after_merge(cls):
         Override.clean()
+        ChannelSearch.clean()
 
 class Channel(database.Model):
     slug         = peewee.CharField(primary_key=True)
@@ -524,15 +525,52 @@ class Channel(database.Model):
         elif playlist_id:
             query = query.where(cls.playlist_id == playlist_id)
 
+        queries = [query]
         if search:
-            query = query.where(cls.name.concat(' ').concat(cls.url) ** '%{}%'.format(search))
-
-        if page_size > 0:
-            query = query.paginate(page, page_size)
+            like  = cls.name.concat(' ').concat(cls.url) ** '%{}%'.format(search)
+            match = ChannelSearch.match(search)
+
+            if match is None:
+                queries = [query.where(like)]
+            else:
+                ## ranked word / prefix matches first, then any other substring matches in channel order
+                matches = ChannelSearch.select(ChannelSearch.slug).where(match)
+                queries = [
+                    query.switch(cls).join(ChannelSearch, on=(ChannelSearch.slug == cls.slug)).where(match) \
+                        .order_by(ChannelSearch.rank, cls.chno.asc(nulls='LAST'), cls.playlist.order, cls.order),
+                    query.where(like & cls.slug.not_in(matches)),
+                ]
 
         with cls.merged():
-            for channel in query.prefetch(Playlist):
-                yield(channel)
+            for query in cls._paginate(queries, page, page_size):
+                for channel in query.prefetch(Playlist):
+                    yield(channel)
+
+    @staticmethod
+    def _paginate(queries, page, page_size):
+        ## one page across the results of the queries, one after the other
+        if page_size <= 0:
+            for query in queries:
+                yield query
+            return
+
+        offset = (page - 1) * page_size
+        limit  = page_size
+
+        for query in queries[:-1]:
+            count = query.count()
+            if offset >= count:
+                offset -= count
+                continue
+
+            yield query.limit(limit).offset(offset)
+
+            limit -= min(count - offset, limit)
+            offset = 0
+            if limit <= 0:
+                return
+
+        yield queries[-1].limit(limit).offset(offset)
 
     @classmethod
     @contextmanager
@@ -709,9 +747,100 @@ class Override(database.Model):
         else:
             super(Override, self).save(*args, **kwargs)
 
+        ChannelSearch.index(slugs=[self.slug])
+
     @classmethod
     def clean(cls):
         slugs = cls.select(cls.slug).join(Channel, on=(Channel.slug == cls.slug))
         cls.delete().where((cls.slug.not_in(slugs)) | ((cls.fields=={}) & (cls.attribs=={}) & (cls.properties=={}))).execute()
 
+class ChannelSearch(database.Model):
+    ## FTS5 index of each channel's merged (overrides applied) name, url, groups and epg id used by search.
+    ## It's a virtual table so it's created here instead of by check_tables.
+    ## Rows are joined back to channel by slug so any left behind by deleted channels are never returned.
+    slug           = peewee.BareField()
+    playlist_id    = peewee.BareField()
+    name           = peewee.BareField()
+    url            = peewee.BareField()
+    groups         = peewee.BareField()
+    epg_id         = peewee.BareField()
+
+    # fts5 hidden columns
+    rank           = peewee.BareField()
+    channel_search = peewee.BareField()
+
+    COLUMNS      = ['slug UNINDEXED', 'playlist_id UNINDEXED', 'name', 'url', 'groups', 'epg_id']
+    RANK         = 'bm25(0, 0, 10.0, 1.0, 4.0, 2.0)'
+    _unavailable = False
+
+    class Meta:
+        table_name  = 'channel_search'
+        primary_key = False
+
+    @classmethod
+    def available(cls):
+        if cls._unavailable:
+            return False
+
+        if cls.table_exists():
+            return True
+
+        try:
+            database.db.execute_sql('CREATE VIRTUAL TABLE "{0}" USING fts5({1})'.format(cls.table_name(), ', '.join(cls.COLUMNS)))
+            database.db.execute_sql('INSERT INTO "{0}" ("{0}", rank) VALUES (\'rank\', ?)'.format(cls.table_name()), (cls.RANK,))
+        except peewee.OperationalError as e:
+            log.debug('FTS5 not available. Channel search will use LIKE')
+            log.exception(e)
+            cls._unavailable = True
+            return False
+
+        cls.index()
+        return True
+
+    @classmethod
+    def match(cls, search):
+        tokens = re.findall(r'\w+', search, flags=re.UNICODE)
+        if not tokens or not cls.available():
+            return None
+
+        query = u' '.join(u'"{}"*'.format(token) for token in tokens)
+        return peewee.Expression(cls.channel_search, 'MATCH', query)
+
+    @classmethod
+    def index(cls, playlist=None, slugs=None):
+        """Rebuilds the rows for a playlist, some channels or all channels"""
+        if not cls.available():
+            return
+
+        channels  = Channel.select()
+        overrides = Override.select(Override.slug, Override.fields)
+        delete    = cls.delete()
+
+        if playlist is not None:
+            channels  = channels.where(Channel.playlist == playlist)
+            overrides = overrides.where(Override.playlist == playlist)
+            delete    = delete.where(cls.playlist_id == playlist.id)
+        elif slugs is not None:
+            channels  = channels.where(Channel.slug.in_(slugs))
+            overrides = overrides.where(Override.slug.in_(slugs))
+            delete    = delete.where(cls.slug.in_(slugs))
+
+        fields = dict((override.slug, override.fields) for override in overrides)
+
+        rows = []
+        for row in channels.select(Channel.slug, Channel.playlist, Channel.name, Channel.url, Channel.groups, Channel.epg_id).dicts():
+            row.update(fields.get(row['slug'], {}))
+            rows.append((row['slug'], row['playlist'], row['name'] or '', row['url'] or '', u' '.join(row['groups'] or []), row['epg_id'] or ''))
+
+        sql = 'INSERT INTO "{}" VALUES ({})'.format(cls.table_name(), ', '.join(['?'] * len(cls.COLUMNS)))
+
+        with database.db.atomic():
+            delete.execute()
+            database.db.cursor().executemany(sql, rows)
+
+    @classmethod
+    def clean(cls):
+        if cls.available():
+            cls.delete().where(cls.slug.not_in(Channel.select(Channel.slug))).execute()
+
 database.tables.extend([Playlist, EPG, Channel, Override])
\ No newline at end of file
@@ -11,7 +11,7 @@ from slyguy.constants import ADDON_PROFILE, KODI_VERSION, ADDON_ICON
 from slyguy.exceptions import PluginError
 
 from .language import _
-from .models import Playlist, Source, EPG, Channel, Override, play_channel, merge_info
+from .models import Playlist, Source, EPG, Channel, Override, ChannelSearch, play_channel, merge_info
 from .constants import *
 from .merger import Merger
 
@@ -421,6 +421,7 @@ def reset_channel(slug, **kwargs):
         channel.delete_instance()
 
     Override.delete().where(Override.slug == channel.slug).execute()
+    ChannelSearch.index(slugs=[channel.slug])
 
     gui.refresh()
 
@@ -510,6 +511,7 @@ def add_channel(playlist_id, radio, **kwargs):
     channel = Channel.from_url(playlist, url)
     channel.radio = radio
     channel.save(force_insert=True)
+    ChannelSearch.index(slugs=[channel.slug])
 
     gui.refresh()
 
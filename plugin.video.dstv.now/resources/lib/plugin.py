@@ -1,12 +1,10 @@
 import codecs
-import threading
 from xml.sax.saxutils import escape
 
 import arrow
 from kodi_six import xbmcplugin, xbmc
-from six.moves import queue
 
-from slyguy import plugin, gui, userdata, inputstream, signals, settings
+from slyguy import plugin, gui, userdata, inputstream, signals, settings, concurrency
 from slyguy.session import Session
 from slyguy.log import log
 from slyguy.util import gzip_extract
@@ -429,55 +427,20 @@ def epg(output, **kwargs):
         EPG_DAYS = settings.getInt('epg_days', 3)
         WORKERS  = 3
 
-        queue_data   = queue.Queue()
-        queue_failed = queue.Queue()
-        queue_tasks  = queue.Queue()
-        queue_errors = queue.Queue()
-
-        for id in ids:
-            queue_tasks.put(id)
-
-        def xml_worker():
-            while True:
-                id, data = queue_data.get()
-                try:
-                    process_data(id, data)
-                except Exception as e:
-                    queue_errors.put(e)
-                finally:
-                    queue_data.task_done()
-
-        def worker():
-            while True:
-                id = queue_tasks.get()
-                try:
-                    data = api.epg(id, start.shift(days=-1), start.shift(days=EPG_DAYS+1), attempts=1)
-                    if not data:
-                        raise Exception()
-
-                    queue_data.put([id, data])
-                except Exception as e:
-                    queue_failed.put(id)
-                finally:
-                    queue_tasks.task_done()
-
-        for i in range(WORKERS):
-            thread = threading.Thread(target=worker)
-            thread.daemon = True
-            thread.start()
-
-        thread = threading.Thread(target=xml_worker)
-        thread.daemon = True
-        thread.start()
-
-        queue_tasks.join()
-        queue_data.join()
-
-        if not queue_errors.empty():
-            raise Exception('Error processing data')
-
-        while not queue_failed.empty():
-            id = queue_failed.get_nowait()
+        def get_data(id):
+            try:
+                return api.epg(id, start.shift(days=-1), start.shift(days=EPG_DAYS+1), attempts=1)
+            except Exception as e:
+                return None
+
+        failed = []
+        for id, data in zip(ids, concurrency.imap(get_data, ids, workers=WORKERS)):
+            if data:
+                process_data(id, data)
+            else:
+                failed.append(id)
+
+        for id in failed:
             data = api.epg(id, start.shift(days=-1), start.shift(days=EPG_DAYS+1), attempts=1 if id in no_events else 10)
             if data:
                 process_data(id, data)
@@ -5,6 +5,7 @@ import datetime
 from slyguy import userdata, settings
 from slyguy.session import Session
 from slyguy.exceptions import Error
+from slyguy.util import paginate
 
 from .constants import HEADERS, API_URL, DEFAULT_HOST, PAGE_SIZE
 from .language import _
@@ -45,10 +46,16 @@ class API(object):
 
         return self._session.get('users/me/subscribed-courses', params=params).json()
 
-    def chapters(self, course_id, page=1):
+    def _curriculum(self, course_id, params):
+        def fetch_page(page):
+            page_params = dict(params, page=page, page_size=PAGE_SIZE)
+            data = self._session.get('courses/{}/cached-subscriber-curriculum-items'.format(course_id), params=page_params).json()
+            return data['results'], data.get('count')
+
+        return paginate(fetch_page, PAGE_SIZE)
+
+    def chapters(self, course_id):
         params = {
-            'page'             : page,
-            'page_size'        : PAGE_SIZE,
             'fields[course]'   : 'image_480x270',
             'fields[chapter]'  : 'description,object_index,title,course',
             'fields[lecture]'  : 'id',
@@ -56,14 +63,10 @@ class API(object):
             'fields[quiz]'     : 'id',
         }
 
-        data = self._session.get('courses/{}/cached-subscriber-curriculum-items'.format(course_id), params=params).json()
-        rows = [r for r in data['results'] if r['_class'] == 'chapter']
-        return rows, data['next']
+        return [r for r in self._curriculum(course_id, params) if r['_class'] == 'chapter']
 
-    def lectures(self, course_id, chapter_id, page=1):
+    def lectures(self, course_id, chapter_id):
         params = {
-            'page'             : page,
-            'page_size'        : PAGE_SIZE,
             'fields[course]'   : 'image_480x270,title',
             'fields[chapter]'  : 'id',
             'fields[lecture]'  : 'title,object_index,description,is_published,course,id,asset',
@@ -72,11 +75,9 @@ class API(object):
             'fields[quiz]'     : 'id',
         }
 
-        data = self._session.get('courses/{}/cached-subscriber-curriculum-items'.format(course_id), params=params).json()
-
         lectures = []
         found = False
-        for row in data['results']:
+        for row in self._curriculum(course_id, params):
             if not found and row['_class'] == 'chapter' and row['id'] == int(chapter_id):
                 found = True
 
@@ -86,7 +87,7 @@ class API(object):
             elif found and row['_class'] == 'chapter':
                 break
 
-        return lectures, data['next']
+        return lectures
 
     def get_stream_data(self, asset_id):
         params = {
@@ -122,11 +122,10 @@ def _process_courses(rows):
     return items
 
 @plugin.route()
-def chapters(course_id, title, page=1, **kwargs):
-    page   = int(page)
+def chapters(course_id, title, **kwargs):
     folder = plugin.Folder(title)
 
-    rows, next_page = api.chapters(course_id, page=page)
+    rows = api.chapters(course_id)
 
     for row in sorted(rows, key=lambda r: r['object_index']):
         folder.add_item(
@@ -136,20 +135,13 @@ def chapters(course_id, title, page=1, **kwargs):
             info      = {'plot': strip_tags(row['description'])},
         )
 
-    if next_page:
-        folder.add_item(
-            label = _(_.NEXT_PAGE, _bold=True),
-            path  = plugin.url_for(chapters, course_id=course_id, title=title, page=page+1),
-        )
-
     return folder
 
 @plugin.route()
-def lectures(course_id, chapter_id, title, page=1, **kwargs):
-    page    = int(page)
+def lectures(course_id, chapter_id, title, **kwargs):
     folder = plugin.Folder(title)
 
-    rows, next_page = api.lectures(course_id, chapter_id, page=page)
+    rows = api.lectures(course_id, chapter_id)
 
     for row in rows:
         folder.add_item(
@@ -166,12 +158,6 @@ def lectures(course_id, chapter_id, title, page=1, **kwargs):
             playable = True,
         )
 
-    if next_page:
-        folder.add_item(
-            label = _(_.NEXT_PAGE, _bold=True),
-            path  = plugin.url_for(lectures, course_id=course_id, chapter_id=chapter_id, title=title, page=page+1),
-        )
-
     return folder
 
 def select_quality(qualities):
@@ -5,4 +5,9 @@ ADDONS_MD5         = 'https://k.slyguy.xyz/.repo/addons.xml.md5'
 NEWS_CHECK_TIME    = 7200 #2 Hours
 UPDATES_CHECK_TIME = 3600 #1 Hour
 NEWS_MAX_TIME      = 432000 #5 Days
-SERVICE_BUILD_TIME = 3600 #1 Hour
\ No newline at end of file
+SERVICE_BUILD_TIME = 3600 #1 Hour
+
+## PROXY METRICS ##
+STATS_PATH      = '/_slyguy/stats'
+LATENCY_BUCKETS = [25, 50, 100, 250, 500, 1000, 2500, 5000, 10000] #ms
+METRIC_SAMPLES  = 500 #recent samples kept for percentiles
@@ -0,0 +1,379 @@
+from collections import OrderedDict
+from xml.parsers import expat
+
+from six.moves.urllib.parse import urljoin
+
+from slyguy.log import log
+
+ROLE_SCHEME = 'urn:mpeg:dash:role:2011'
+
+class Node(object):
+    __slots__ = ['tag', 'attrib', 'children', 'parent', 'removed']
+
+    def __init__(self, tag, attrib=None, parent=None):
+        self.tag      = tag
+        self.attrib   = attrib if attrib is not None else OrderedDict()
+        self.children = []
+        self.parent   = parent
+        self.removed  = False
+
+    def append(self, node):
+        node.parent  = self
+        node.removed = False
+        self.children.append(node)
+
+    def remove(self):
+        if self.parent:
+            self.parent.children.remove(self)
+        self.removed = True
+
+    @property
+    def attached(self):
+        node = self
+        while node:
+            if node.removed:
+                return False
+            node = node.parent
+        return True
+
+    @property
+    def text(self):
+        return u''.join([x for x in self.children if not isinstance(x, (Node, Comment))])
+
+    @text.setter
+    def text(self, value):
+        self.children = [x for x in self.children if isinstance(x, (Node, Comment))]
+        self.children.insert(0, value)
+
+    def has_descendant(self, tag):
+        for child in self.children:
+            if isinstance(child, Node) and (child.tag == tag or child.has_descendant(tag)):
+                return True
+        return False
+
+class Comment(object):
+    __slots__ = ['data']
+
+    def __init__(self, data):
+        self.data = data
+
+def _escape_text(value):
+    return value.replace(u'&', u'&amp;').replace(u'<', u'&lt;').replace(u'>', u'&gt;')
+
+def _escape_attrib(value):
+    return _escape_text(value).replace(u'"', u'&quot;')
+
+class DashRewriter(object):
+    """Rewrites a DASH manifest using a single expat pass plus a light node tree.
+
+    Does the same fixes as the minidom path but only touches the nodes it collected
+    while parsing, instead of repeated getElementsByTagName walks over the whole DOM.
+    """
+    def __init__(self, data, base_url, proxy_path, default_language='', subtitles=None):
+        self._data             = data
+        self._base_url         = base_url
+        self._proxy_path       = proxy_path
+        self._default_language = (default_language or '').lower()
+        self._subtitles        = subtitles or []
+
+        self._root      = Node(None)
+        self._current   = self._root
+        self._mpd       = None
+        self._periods   = []
+        self._adap_sets = []
+        self._reps      = []
+        self._base_urls = []
+        self._segments  = []
+        self._roles     = []
+
+        self._all_streams = []
+
+    ## PARSE ##
+    def _start(self, tag, attrs):
+        attrib = OrderedDict()
+        for i in range(0, len(attrs), 2):
+            attrib[attrs[i]] = attrs[i+1]
+
+        node = Node(tag, attrib, self._current)
+        self._current.children.append(node)
+        self._current = node
+
+        if tag == 'MPD' and self._mpd is None:
+            self._mpd = node
+            ## Remove publishTime PR: https://github.com/xbmc/inputstream.adaptive/pull/564
+            if attrib.pop('publishTime', None) is not None:
+                log.debug('Dash Fix: publishTime removed')
+
+        elif tag == 'Period':
+            self._periods.append(node)
+
+        elif tag == 'AdaptationSet':
+            self._adap_sets.append([node, []])
+
+        elif tag == 'Representation':
+            if self._adap_sets:
+                self._adap_sets[-1][1].append(node)
+
+        elif tag == 'BaseURL':
+            self._base_urls.append(node)
+
+        elif tag in ('SegmentTemplate', 'SegmentURL'):
+            self._segments.append(node)
+
+        elif tag == 'Role' and attrib.get('schemeIdUri') == ROLE_SCHEME:
+            self._roles.append(node)
+
+    def _end(self, tag):
+        self._current = self._current.parent
+
+    def _chars(self, data):
+        children = self._current.children
+        if children and not isinstance(children[-1], (Node, Comment)):
+            children[-1] += data
+        else:
+            children.append(data)
+
+    def _comment(self, data):
+        self._current.children.append(Comment(data))
+
+    def _parse(self):
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        parser.ordered_attributes = True
+        parser.StartElementHandler = self._start
+        parser.EndElementHandler = self._end
+        parser.CharacterDataHandler = self._chars
+        parser.CommentHandler = self._comment
+        parser.Parse(self._data.encode('utf8'), True)
+
+        if self._mpd is None:
+            raise Exception('No MPD element found')
+
+    ## REWRITE ##
+    def parse(self):
+        self._parse()
+
+        ## Live mpd needs non-last periods removed
+        ## https://github.com/xbmc/inputstream.adaptive/issues/574
+        if self._mpd.attrib.get('type', '').lower() == 'dynamic' and len(self._periods) > 1:
+            for elem in self._periods[:-1]:
+                elem.remove()
+
+        ## SORT ADAPTION SETS BY BITRATE ##
+        video_sets = []
+        audio_sets = []
+        lang_adap_sets = []
+        streams, ids = [], []
+        adap_parent = None
+
+        for adap_set, reps in self._adap_sets:
+            if not adap_set.attached:
+                continue
+
+            adap_parent = adap_set.parent
+
+            highest_bandwidth = 0
+            is_video = False
+            is_trick = False
+
+            ## Make sure Representation are last in adaptionset
+            rep_ids = set(id(x) for x in reps)
+            adap_set.children = [x for x in adap_set.children if id(x) not in rep_ids] + reps
+
+            for rep in reps:
+                attribs = dict(adap_set.attrib)
+                attribs.update(rep.attrib)
+
+                if self._default_language and 'audio' in attribs.get('mimeType', '') and attribs.get('lang', '').lower() == self._default_language and adap_set not in lang_adap_sets:
+                    lang_adap_sets.append(adap_set)
+
+                bandwidth = 0
+                if 'bandwidth' in attribs:
+                    bandwidth = int(attribs['bandwidth'])
+                    if bandwidth > highest_bandwidth:
+                        highest_bandwidth = bandwidth
+
+                if 'maxPlayoutRate' in attribs:
+                    is_trick = True
+
+                if 'video' in attribs.get('mimeType', '') and not is_trick:
+                    is_video = True
+
+                    resolution = ''
+                    if 'width' in attribs and 'height' in attribs:
+                        resolution = '{}x{}'.format(attribs['width'], attribs['height'])
+
+                    frame_rate = ''
+                    if 'frameRate'in attribs:
+                        frame_rate = attribs['frameRate']
+                        try:
+                            if '/' in str(frame_rate):
+                                split = frame_rate.split('/')
+                                frame_rate = float(split[0]) / float(split[1])
+                        except:
+                            frame_rate = ''
+
+                    codecs = [x for x in attribs.get('codecs', '').split(',') if x]
+                    stream = {'bandwidth': bandwidth, 'resolution': resolution, 'frame_rate': frame_rate, 'codecs': codecs, 'id': attribs['id'], 'elem': rep}
+                    self._all_streams.append(stream)
+
+                    if stream['id'] not in ids:
+                        streams.append(stream)
+                        ids.append(stream['id'])
+
+            adap_set.remove()
+
+            if is_trick:
+                continue
+
+            if is_video:
+                video_sets.append([highest_bandwidth, adap_set, adap_parent])
+            else:
+                audio_sets.append([highest_bandwidth, adap_set, adap_parent])
+
+        video_sets.sort(key=lambda x: x[0], reverse=True)
+        audio_sets.sort(key=lambda x: x[0], reverse=True)
+
+        for elem in video_sets + audio_sets:
+            elem[2].append(elem[1])
+
+        ## Set default languae
+        if lang_adap_sets:
+            for elem in self._roles:
+                if elem.attached:
+                    elem.remove()
+
+            for adap_set in lang_adap_sets:
+                adap_set.append(Node('Role', OrderedDict([('schemeIdUri', ROLE_SCHEME), ('value', 'main')])))
+                log.debug('default language set to: %s', self._default_language)
+        #############
+
+        ## Insert subtitles
+        if adap_parent:
+            for idx, subtitle in enumerate(self._subtitles):
+                elem = Node('AdaptationSet', OrderedDict([('mimeType', subtitle[0]), ('lang', subtitle[1]), ('id', 'caption_{}'.format(idx))]))
+
+                elem2 = Node('Representation', OrderedDict([('id', 'caption_rep_{}'.format(idx))]))
+                if 'ttml' in subtitle[0]:
+                    elem2.attrib['codecs'] = 'ttml'
+
+                elem3 = Node('BaseURL')
+                elem3.text = subtitle[2]
+
+                elem2.append(elem3)
+                elem.append(elem2)
+                adap_parent.append(elem)
+
+                self._adap_sets.append([elem, [elem2]])
+                self._base_urls.append(elem3)
+        ##################
+
+        ## Convert BaseURLS
+        base_url_parents = set()
+        for elem in self._base_urls:
+            if not elem.attached:
+                continue
+
+            url = elem.text
+
+            if id(elem.parent) in base_url_parents:
+                log.debug('Non-1st BaseURL removed: %s', url)
+                elem.remove()
+                continue
+
+            if '://' not in url:
+                url = urljoin(self._base_url, url)
+
+            elem.text = self._proxy_path + url
+            base_url_parents.add(id(elem.parent))
+        ################
+
+        ## Convert to proxy paths
+        first_base = {}
+        def get_first_base(node):
+            key = id(node)
+            if key not in first_base:
+                first_base[key] = None
+                for child in node.children:
+                    if not isinstance(child, Node):
+                        continue
+
+                    found = child if child.tag == 'BaseURL' else get_first_base(child)
+                    if found:
+                        first_base[key] = found
+                        break
+
+            return first_base[key]
+
+        def get_base_url(node):
+            node = node.parent
+            while node:
+                base_url = get_first_base(node)
+                if base_url:
+                    return base_url
+                node = node.parent
+
+            return None
+
+        for e in self._segments:
+            if not e.attached:
+                continue
+
+            for attrib in ('initialization', 'media'):
+                if attrib not in e.attrib:
+                    continue
+
+                url = e.attrib[attrib]
+                if '://' in url:
+                    e.attrib[attrib] = self._proxy_path + url
+                else:
+                    base_url = get_base_url(e)
+                    ## Fixed with https://github.com/xbmc/inputstream.adaptive/pull/606
+                    if base_url and not base_url.text.endswith('/'):
+                        base_url.text = base_url.text + '/'
+                        log.debug('Dash Fix: base_url / fixed')
+
+            ## Remove presentationTimeOffset PR: https://github.com/xbmc/inputstream.adaptive/pull/564/
+            if e.attrib.pop('presentationTimeOffset', None) is not None:
+                log.debug('Dash Fix: presentationTimeOffset removed')
+        ###############
+
+        return streams
+
+    def output(self, selected=None):
+        ## Remove non-selected qualities
+        if selected:
+            for stream in self._all_streams:
+                if stream['id'] != selected['id'] and stream['elem'].attached:
+                    stream['elem'].remove()
+        #################
+
+        ## Remove empty adaption sets
+        for adap_set, reps in self._adap_sets:
+            if adap_set.attached and not adap_set.has_descendant('Representation'):
+                adap_set.remove()
+        #################
+
+        out = [u'<?xml version="1.0" encoding="utf-8"?>']
+        self._write(self._root, out)
+        return u''.join(out).encode('utf8')
+
+    def _write(self, node, out):
+        for child in node.children:
+            if isinstance(child, Node):
+                out.append(u'<' + child.tag)
+                for key in child.attrib:
+                    out.append(u' {}="{}"'.format(key, _escape_attrib(child.attrib[key])))
+
+                if child.children:
+                    out.append(u'>')
+                    self._write(child, out)
+                    out.append(u'</{}>'.format(child.tag))
+                else:
+                    out.append(u'/>')
+
+            elif isinstance(child, Comment):
+                out.append(u'<!--{}-->'.format(child.data))
+
+            else:
+                out.append(_escape_text(child))
@@ -0,0 +1,85 @@
+import re
+
+ATTRIB_RE = re.compile(r'([\w-]+)="?([^",]*)[",$]?')
+
+def parse_attribs(line):
+    attribs = {}
+
+    for key, value in ATTRIB_RE.findall(line):
+        attribs[key.upper()] = value.strip()
+
+    return attribs
+
+class Tag(object):
+    __slots__ = ['name', 'line', 'attribs', 'dirty', 'removed']
+
+    def __init__(self, name, line):
+        self.name    = name
+        self.line    = line
+        self.attribs = parse_attribs(line) if name else {}
+        self.dirty   = False
+        self.removed = False
+
+    def output(self):
+        if not self.dirty:
+            return self.line
+
+        if not self.attribs:
+            return ''
+
+        return u'{}:{}'.format(self.name, u','.join([u'{}="{}"'.format(key, self.attribs[key]) for key in self.attribs]))
+
+class Variant(object):
+    __slots__ = ['tag', 'uri']
+
+    def __init__(self, tag, uri):
+        self.tag = tag
+        self.uri = uri
+
+class MasterPlaylist(object):
+    """Tokenizes a HLS master playlist once into typed records.
+
+    Only #EXT-X-MEDIA and #EXT-X-STREAM-INF (plus its uri line) become records.
+    Every other line is kept as-is so output is identical apart from the changes made.
+    """
+    def __init__(self, data):
+        self.lines    = []
+        self.media    = []
+        self.variants = []
+
+        stream_inf = None
+        for line in data.splitlines():
+            if line.startswith('#EXT-X-MEDIA'):
+                tag = Tag('#EXT-X-MEDIA', line)
+                self.media.append(tag)
+                self.lines.append(tag)
+
+            elif line.startswith('#EXT-X-STREAM-INF'):
+                stream_inf = Tag('#EXT-X-STREAM-INF', line)
+                self.lines.append(stream_inf)
+
+            elif stream_inf and line.strip() and not line.startswith('#'):
+                uri = Tag(None, line)
+                self.variants.append(Variant(stream_inf, uri))
+                self.lines.append(uri)
+                stream_inf = None
+
+            else:
+                self.lines.append(line)
+
+    def remove_variant(self, variant):
+        variant.tag.removed = True
+        variant.uri.removed = True
+
+    def output(self):
+        lines = []
+
+        for line in self.lines:
+            if isinstance(line, Tag):
+                if line.removed:
+                    continue
+                line = line.output()
+
+            lines.append(line)
+
+        return u'\n'.join(lines)
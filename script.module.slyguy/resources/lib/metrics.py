@@ -0,0 +1,136 @@
+import time
+import threading
+from collections import deque, defaultdict
+
+from .constants import LATENCY_BUCKETS, METRIC_SAMPLES
+
+def _percentile(values, percent):
+    if not values:
+        return None
+
+    index = int(round((len(values) - 1) * percent / 100.0))
+    return values[index]
+
+class Histogram(object):
+    """Counts of millisecond values per bucket (last bucket is anything above) plus
+    the most recent samples for percentiles"""
+    def __init__(self, buckets=LATENCY_BUCKETS, samples=METRIC_SAMPLES):
+        self._buckets = buckets
+        self._counts  = [0] * (len(buckets) + 1)
+        self._samples = deque(maxlen=samples)
+        self.count    = 0
+        self.sum      = 0
+        self.max      = 0
+
+    def add(self, ms):
+        for i, bucket in enumerate(self._buckets):
+            if ms <= bucket:
+                break
+        else:
+            i = len(self._buckets)
+
+        self._counts[i] += 1
+        self._samples.append(ms)
+        self.count += 1
+        self.sum   += ms
+        self.max    = max(self.max, ms)
+
+    def to_dict(self):
+        values = sorted(self._samples)
+        labels = ['<={}'.format(x) for x in self._buckets] + ['>{}'.format(self._buckets[-1])]
+
+        return {
+            'count': self.count,
+            'avg': round(self.sum / float(self.count), 1) if self.count else None,
+            'max': self.max,
+            'p50': _percentile(values, 50),
+            'p90': _percentile(values, 90),
+            'p99': _percentile(values, 99),
+            'buckets': dict(zip(labels, self._counts)),
+        }
+
+class HostMetrics(object):
+    def __init__(self):
+        self.latency  = Histogram()
+        self.status   = defaultdict(int)
+        self.retries  = 0
+        self.errors   = 0
+        self.bytes    = 0
+        self.seconds  = 0.0
+
+    def to_dict(self):
+        return {
+            'latency_ms': self.latency.to_dict(),
+            'status': dict((str(key), value) for key, value in self.status.items()),
+            'retries': self.retries,
+            'errors': self.errors,
+            'bytes': self.bytes,
+            'mbps': round(self.bytes * 8 / self.seconds / 1000000, 2) if self.seconds else None,
+        }
+
+class Metrics(object):
+    """In-memory counters for the proxy. Served as json on STATS_PATH"""
+    def __init__(self):
+        self._lock     = threading.Lock()
+        self._started  = time.time()
+        self._hosts    = defaultdict(HostMetrics)
+        self._rewrites = defaultdict(Histogram)
+        self._requests = defaultdict(int)
+        self._active   = 0
+        self._prefetch = 0
+        self._bytes    = 0
+        self._seconds  = 0.0
+
+    def connection(self, change):
+        with self._lock:
+            self._active += change
+
+    def request(self, method):
+        with self._lock:
+            self._requests[method] += 1
+
+    def prefetch_hit(self):
+        with self._lock:
+            self._prefetch += 1
+
+    def upstream(self, host, status_code, seconds, retries=0):
+        with self._lock:
+            row = self._hosts[host]
+            row.latency.add(int(seconds * 1000))
+            row.status[status_code] += 1
+            row.retries += retries
+
+    def upstream_error(self, host, retries=0):
+        with self._lock:
+            row = self._hosts[host]
+            row.errors += 1
+            row.retries += retries
+
+    def relayed(self, host, size, seconds):
+        with self._lock:
+            self._bytes   += size
+            self._seconds += seconds
+
+            if host:
+                row = self._hosts[host]
+                row.bytes   += size
+                row.seconds += seconds
+
+    def rewrite(self, name, seconds):
+        with self._lock:
+            self._rewrites[name].add(int(seconds * 1000))
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'uptime': int(time.time() - self._started),
+                'active_connections': self._active,
+                'requests': dict(self._requests),
+                'prefetch_hits': self._prefetch,
+                'relayed': {
+                    'bytes': self._bytes,
+                    'mbps': round(self._bytes * 8 / self._seconds / 1000000, 2) if self._seconds else None,
+                },
+                'upstream': dict((host, self._hosts[host].to_dict()) for host in self._hosts),
+                'rewrite_ms': dict((name, self._rewrites[name].to_dict()) for name in self._rewrites),
+            }
@@ -0,0 +1,111 @@
+import threading
+from collections import OrderedDict
+
+from slyguy.log import log
+
+class LRUCache(object):
+    def __init__(self, max_bytes):
+        self._max_bytes = max_bytes
+        self._size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.pop(key, None)
+            if value is not None:
+                self._data[key] = value
+            return value
+
+    def set(self, key, value, size):
+        if size > self._max_bytes:
+            return
+
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+
+            self._data[key] = [value, size]
+            self._size += size
+
+            while self._size > self._max_bytes:
+                key, old = self._data.popitem(last=False)
+                self._size -= old[1]
+
+class Prefetcher(object):
+    """Downloads the next segments of known media playlists in the background.
+
+    Segments are keyed by absolute url. A request for a segment that is still
+    downloading waits for that download instead of starting another one.
+    """
+    def __init__(self, fetch, segments=3, max_bytes=50*1024*1024, workers=2, timeout=30):
+        self._fetch     = fetch
+        self._segments  = segments
+        self._timeout   = timeout
+        self._cache     = LRUCache(max_bytes)
+        self._lock      = threading.Lock()
+        self._playlists = {}
+        self._positions = {}
+        self._pending   = {}
+        self._workers   = threading.BoundedSemaphore(workers)
+
+    def add_playlist(self, key, urls):
+        with self._lock:
+            for url in self._playlists.get(key, []):
+                self._positions.pop(url, None)
+
+            self._playlists[key] = urls
+            for index, url in enumerate(urls):
+                self._positions[url] = (key, index)
+
+    def get(self, url):
+        with self._lock:
+            event = self._pending.get(url)
+
+        if event:
+            event.wait(self._timeout)
+
+        row = self._cache.get(url)
+        if row is None:
+            return None
+
+        log.debug('PREFETCH HIT: %s', url)
+        return row[0]
+
+    def ahead(self, url, headers):
+        with self._lock:
+            position = self._positions.get(url)
+            if not position:
+                return
+
+            key, index = position
+            urls = []
+            for _url in self._playlists[key][index+1:index+1+self._segments]:
+                if _url in self._pending or self._cache.get(_url) is not None:
+                    continue
+
+                self._pending[_url] = threading.Event()
+                urls.append(_url)
+
+        for _url in urls:
+            thread = threading.Thread(target=self._worker, args=(_url, headers))
+            thread.daemon = True
+            thread.start()
+
+    def _worker(self, url, headers):
+        try:
+            with self._workers:
+                result = self._fetch(url, headers)
+
+            if result:
+                self._cache.set(url, result, len(result[2]))
+        except Exception as e:
+            log.debug('PREFETCH FAILED: %s', url)
+            log.exception(e)
+        finally:
+            with self._lock:
+                event = self._pending.pop(url, None)
+
+            if event:
+                event.set()
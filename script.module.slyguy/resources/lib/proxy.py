@@ -20,20 +20,28 @@ from requests import ConnectionError
 
 from slyguy.log import log
 from slyguy.constants import *
-from slyguy.util import check_port, remove_file, get_kodi_string, set_kodi_string, fix_url
+from slyguy.util import check_port, remove_file, get_kodi_string, set_kodi_string, fix_url, url_sub
 from slyguy.exceptions import Exit
-from slyguy import settings, gui
+from slyguy import settings, gui, proxy_hooks
 from slyguy.session import RawSession
 from slyguy.language import _
 from slyguy.router import add_url_args
 
 from .constants import *
+from .dash import DashRewriter
+from .hls import MasterPlaylist
+from .prefetch import Prefetcher
+from .subtitles import SubtitleCache
+from .metrics import Metrics
 
 #ADDON_DEV = True
 
 REMOVE_IN_HEADERS = ['upgrade', 'host']
 REMOVE_OUT_HEADERS = ['date', 'server', 'transfer-encoding']
 
+RELAY_BUFFER_SIZE = max(CHUNK_SIZE, 256 * 1024)
+RELAY_MAX_BUFFERS = 8
+
 PROXY_PORT = check_port(PROXY_PORT)
 if not PROXY_PORT:
     PROXY_PORT = check_port()
@@ -57,6 +65,11 @@ PROXY_GLOBAL = {
     'session': {},
 }
 
+SESSION_LOCK = threading.Lock()
+
+SUBTITLES = SubtitleCache(xbmc.translatePath('special://temp/slyguy_subtitles'))
+METRICS = Metrics()
+
 class RequestHandler(BaseHTTPRequestHandler):
     protocol_version = 'HTTP/1.1'
 
@@ -72,12 +85,21 @@ class RequestHandler(BaseHTTPRequestHandler):
     def setup(self):
         BaseHTTPRequestHandler.setup(self)
         self.request.settimeout(5)
+        METRICS.connection(1)
+
+    def finish(self):
+        try:
+            BaseHTTPRequestHandler.finish(self)
+        finally:
+            METRICS.connection(-1)
 
     def _get_url(self):
+        METRICS.request(self.command)
         url = self.path.lstrip('/').strip('\\')
 
         self._headers = {}
         self._plugin_headers = {}
+        self._plugin_data = None
         for header in self.headers:
             if header.lower() not in REMOVE_IN_HEADERS:
                 self._headers[header.lower()] = self.headers[header]
@@ -114,13 +136,38 @@ class RequestHandler(BaseHTTPRequestHandler):
         return url
 
     def _plugin_request(self, url):
-        data_path = xbmc.translatePath('special://temp/proxy.post')
+        params = dict(parse_qsl(urlparse(url).query, keep_blank_values=True))
+        if params.get(ROUTE_TAG) == ROUTE_WEBVTT and params.get('url'):
+            try:
+                data = SUBTITLES.get(self._get_session(), params['url'], self._headers)
+            except Exception as e:
+                log.debug('Proxy subtitle conversion failed. Falling back to plugin')
+                log.exception(e)
+            else:
+                self._plugin_data = proxy_hooks.Response(data, headers={'content-type': 'text/vtt'})
+                return url
+
+        func, kwargs = proxy_hooks.get_hook(proxy_hooks.TYPE_RESOLVER, url)
+        if func:
+            log.debug('PLUGIN REQUEST (IN-PROCESS): %s', url)
+            result = func(self._post_data or b'', dict(self._headers), **kwargs)
+            if isinstance(result, proxy_hooks.Response):
+                self._plugin_data = result
+                return url
+
+            if isinstance(result, tuple):
+                result, self._plugin_headers = result[0], dict(result[1])
+
+            return result
+
+        ## no hook (eg. licence requests that need the addon's login), run the plugin route
+        data_path = xbmc.translatePath('special://temp/proxy.post.{}'.format(uuid.uuid4().hex))
         with open(data_path, 'wb') as f:
             f.write(self._post_data or b'')
 
         url = add_url_args(url, _data_path=data_path, _headers=json.dumps(self._headers))
 
-        log.debug('PLUGIN REQUEST: {}'.format(url))
+        log.debug('PLUGIN REQUEST: %s', url)
         dirs, files = xbmcvfs.listdir(url)
 
         path = unquote(files[0])
@@ -132,18 +179,35 @@ class RequestHandler(BaseHTTPRequestHandler):
 
         return url
 
+    def _untimed(self, func, *args):
+        ## middleware and the quality dialog are left out of the rewrite metrics
+        start = time.time()
+        try:
+            return func(*args)
+        finally:
+            self._untimed_seconds = getattr(self, '_untimed_seconds', 0) + time.time() - start
+
     def _manifest_middleware(self, data):
         url = self._session.get('manifest_middleware')
         if not url:
             return data
 
-        data_path = xbmc.translatePath('special://temp/proxy.manifest')
+        func, kwargs = proxy_hooks.get_hook(proxy_hooks.TYPE_MIDDLEWARE, url)
+        if func:
+            log.debug('PLUGIN MANIFEST MIDDLEWARE (IN-PROCESS): %s', url)
+            result = func(data, dict(self._headers), **kwargs)
+            if isinstance(result, tuple):
+                result, self._plugin_headers = result[0], dict(result[1])
+
+            return result
+
+        data_path = xbmc.translatePath('special://temp/proxy.manifest.{}'.format(uuid.uuid4().hex))
         with open(data_path, 'wb') as f:
             f.write(data.encode('utf8'))
 
         url = add_url_args(url, _data_path=data_path, _headers=json.dumps(self._headers))
 
-        log.debug('PLUGIN MANIFEST MIDDLEWARE REQUEST: {}'.format(url))
+        log.debug('PLUGIN MANIFEST MIDDLEWARE REQUEST: %s', url)
         dirs, files = xbmcvfs.listdir(url)
 
         path = unquote(files[0])
@@ -162,8 +226,12 @@ class RequestHandler(BaseHTTPRequestHandler):
         return data
 
     def do_GET(self):
+        if self.path.startswith(STATS_PATH):
+            self._output_stats()
+            return
+
         url = self._get_url()
-        log.debug('GET IN: {}'.format(url))
+        log.debug('GET IN: %s', url)
 
         if not url:
             response = Response()
@@ -174,7 +242,17 @@ class RequestHandler(BaseHTTPRequestHandler):
             self._output_response(response)
             return
 
-        response = self._proxy_request('GET', url)
+        response = None
+
+        prefetcher = self._session.get('prefetcher')
+        if prefetcher and 'range' not in self._headers:
+            response = self._prefetch_response(prefetcher, url)
+            prefetcher.ahead(url, dict(self._headers))
+            if response:
+                METRICS.prefetch_hit()
+
+        if not response:
+            response = self._proxy_request('GET', url)
 
         if self._session.get('redirecting') or not self._session.get('type') or not self._session.get('manifest'):
             self._output_response(response)
@@ -183,11 +261,17 @@ class RequestHandler(BaseHTTPRequestHandler):
         parse = urlparse(self.path.lower())
 
         try:
+            self._untimed_seconds = 0
+
             if self._session.get('type') == 'm3u8' and (url == self._session['manifest'] or parse.path.endswith('.m3u') or parse.path.endswith('.m3u8')):
-                self._parse_m3u8(response)
+                start = time.time()
+                self._parse_m3u8(response, url)
+                METRICS.rewrite('m3u8', time.time() - start - self._untimed_seconds)
 
             elif self._session.get('type') == 'mpd' and url == self._session['manifest']:
+                start = time.time()
                 self._parse_dash(response)
+                METRICS.rewrite('mpd', time.time() - start - self._untimed_seconds)
                 self._session['manifest'] = None  # unset manifest url so isn't parsed again
         except Exception as e:
             if type(e) != Exit and url == self._session['manifest']:
@@ -198,6 +282,58 @@ class RequestHandler(BaseHTTPRequestHandler):
 
         self._output_response(response)
 
+    def _prefetch_response(self, prefetcher, url):
+        row = prefetcher.get(url)
+        if not row:
+            return None
+
+        self._session['redirecting'] = False
+
+        response = Response()
+        response.status_code, response.headers, content = row[0], dict(row[1]), row[2]
+        response.stream = ResponseStream(response)
+        response.stream.content = content
+
+        return response
+
+    def _prefetch_playlist(self, url, m3u8):
+        segments = settings.getInt('proxy_prefetch', 0)
+        if not segments:
+            return
+
+        session = self._get_session()
+
+        with SESSION_LOCK:
+            if not self._session.get('prefetcher'):
+                url_subs = self._session.get('url_subs')
+                timeout  = settings.getInt('http_timeout', 30)
+
+                def fetch(url, headers):
+                    if url_subs:
+                        url = url_sub(url, url_subs)
+
+                    url  = fix_url(url)
+                    resp = session.request('GET', url, headers=headers, allow_redirects=False, timeout=timeout)
+                    if resp.status_code != 200:
+                        return None
+
+                    headers = {}
+                    for header in resp.headers:
+                        if header.lower() not in REMOVE_OUT_HEADERS and header.lower() != 'set-cookie':
+                            headers[header.lower()] = resp.headers[header]
+
+                    return [resp.status_code, headers, resp.content]
+
+                self._session['prefetcher'] = Prefetcher(fetch, segments=segments, max_bytes=settings.getInt('proxy_prefetch_cache', 50)*1024*1024)
+
+        urls = []
+        for line in m3u8.splitlines():
+            line = line.strip()
+            if line and not line.startswith('#'):
+                urls.append(urljoin(url, line))
+
+        self._session['prefetcher'].add_playlist(url, urls)
+
     def _quality_select(self, qualities):
         def codec_rank(_codecs):
             highest = -1
@@ -319,8 +455,16 @@ class RequestHandler(BaseHTTPRequestHandler):
             return None
 
     def _parse_dash(self, response):
+        data = response.stream.content.decode('utf8')
+        data = self._untimed(self._manifest_middleware, data)
+
+        ## SUPPORT NEW DOLBY FORMAT https://github.com/xbmc/inputstream.adaptive/pull/466
+        data = data.replace('tag:dolby.com,2014:dash:audio_channel_configuration:2011', 'urn:dolby:dash:audio_channel_configuration:2011')
+        ## SUPPORT EC-3 CHANNEL COUNT https://github.com/xbmc/inputstream.adaptive/pull/618
+        data = data.replace('urn:mpeg:mpegB:cicp:ChannelConfiguration', 'urn:mpeg:dash:23003:3:audio_channel_configuration:2011')
+
         if ADDON_DEV:
-            root = parseString(response.stream.content)
+            root = parseString(data.encode('utf8'))
             mpd = root.toprettyxml(encoding='utf-8')
             mpd = b"\n".join([ll.rstrip() for ll in mpd.splitlines() if ll.strip()])
             with open(xbmc.translatePath('special://temp/in.mpd'), 'wb') as f:
@@ -328,20 +472,51 @@ class RequestHandler(BaseHTTPRequestHandler):
 
             start = time.time()
 
-        data = response.stream.content.decode('utf8')
-        data = self._manifest_middleware(data)
+        try:
+            self._parse_dash_fast(response, data)
+        except Exit:
+            raise
+        except Exception as e:
+            log.warning('Proxy: Fast MPD rewrite failed. Falling back to minidom')
+            log.exception(e)
+            self._parse_dash_minidom(response, data)
 
-        ## SUPPORT NEW DOLBY FORMAT https://github.com/xbmc/inputstream.adaptive/pull/466
-        data = data.replace('tag:dolby.com,2014:dash:audio_channel_configuration:2011', 'urn:dolby:dash:audio_channel_configuration:2011')
-        ## SUPPORT EC-3 CHANNEL COUNT https://github.com/xbmc/inputstream.adaptive/pull/618
-        data = data.replace('urn:mpeg:mpegB:cicp:ChannelConfiguration', 'urn:mpeg:dash:23003:3:audio_channel_configuration:2011')
+        if ADDON_DEV:
+            log.debug('Time taken: %s', time.time() - start)
+
+            ## Benchmark against minidom using the now selected quality
+            _response = Response()
+            _response.headers = {}
+            _response.url = response.url
+            _response.stream = ResponseStream(_response)
+
+            start = time.time()
+            self._parse_dash_minidom(_response, data)
+            log.debug('Minidom time taken: %s', time.time() - start)
 
+            root = parseString(response.stream.content)
+            mpd = root.toprettyxml(encoding='utf-8')
+            mpd = b"\n".join([ll.rstrip() for ll in mpd.splitlines() if ll.strip()])
+            with open(xbmc.translatePath('special://temp/out.mpd'), 'wb') as f:
+                f.write(mpd)
+
+    def _parse_dash_fast(self, response, data):
+        rewriter = DashRewriter(data, response.url, PROXY_PATH,
+            default_language = self._session.get('default_language', ''),
+            subtitles = self._session.get('subtitles'),
+        )
+
+        streams = rewriter.parse()
+        selected = self._untimed(self._quality_select, streams)
+        response.stream.content = rewriter.output(selected)
+
+    def _parse_dash_minidom(self, response, data):
         try:
             root = parseString(data.encode('utf8'))
         except Exception as e:
-            log.debug("Proxy: Failed to parse MPD")
+            log.error('Proxy: Failed to parse MPD. Passing it through unmodified')
             log.exception(e)
-            return self._output_response(response)
+            return
 
         mpd = root.getElementsByTagName("MPD")[0]
 
@@ -458,7 +633,7 @@ class RequestHandler(BaseHTTPRequestHandler):
                 elem.setAttribute('schemeIdUri', 'urn:mpeg:dash:role:2011')
                 elem.setAttribute('value', 'main')
                 adap_set.appendChild(elem)
-                log.debug('default language set to: {}'.format(default_language))
+                log.debug('default language set to: %s', default_language)
         #############
 
         ## Insert subtitles
@@ -491,7 +666,7 @@ class RequestHandler(BaseHTTPRequestHandler):
             url = elem.firstChild.nodeValue
 
             if elem.parentNode in base_url_parents:
-                log.debug('Non-1st BaseURL removed: {}'.format(url))
+                log.debug('Non-1st BaseURL removed: %s', url)
                 elem.parentNode.removeChild(elem)
                 continue
 
@@ -541,7 +716,7 @@ class RequestHandler(BaseHTTPRequestHandler):
         ###############
 
         ## Get selected quality
-        selected = self._quality_select(streams)
+        selected = self._untimed(self._quality_select, streams)
         if selected:
             for stream in all_streams:
                 if stream['id'] != selected['id']:
@@ -554,27 +729,9 @@ class RequestHandler(BaseHTTPRequestHandler):
                 adap_set.parentNode.removeChild(adap_set)
         #################
 
-        if ADDON_DEV:
-            mpd = root.toprettyxml(encoding='utf-8')
-            mpd = b"\n".join([ll.rstrip() for ll in mpd.splitlines() if ll.strip()])
-
-            log.debug('Time taken: {}'.format(time.time() - start))
-            with open(xbmc.translatePath('special://temp/out.mpd'), 'wb') as f:
-                f.write(mpd)
-        else:
-            mpd = root.toxml(encoding='utf-8')
-
-        response.stream.content = mpd
+        response.stream.content = root.toxml(encoding='utf-8')
 
     def _parse_m3u8_master(self, m3u8, master_url):
-        def _process_media(line):
-            attribs = {}
-
-            for key, value in re.findall('([\w-]+)="?([^",]*)[",$]?', line):
-                attribs[key.upper()] = value.strip()
-
-            return attribs
-
         audio_whitelist   = [x.strip().lower() for x in self._session.get('audio_whitelist', '').split(',') if x]
         subs_whitelist    = [x.strip().lower() for x in self._session.get('subs_whitelist', '').split(',') if x]
         subs_forced       = int(self._session.get('subs_forced', 1))
@@ -600,49 +757,44 @@ class RequestHandler(BaseHTTPRequestHandler):
 
             return False
 
+        playlist = MasterPlaylist(m3u8)
+
         default_groups = []
         groups = defaultdict(list)
-        for line in m3u8.splitlines():
-            if not line.startswith('#EXT-X-MEDIA'):
-                continue
-
-            attribs = _process_media(line)
+        for tag in playlist.media:
+            attribs = tag.attribs
             if not attribs:
                 continue
 
             if audio_whitelist and attribs.get('TYPE') == 'AUDIO' and 'LANGUAGE' in attribs and not _lang_allowed(attribs['LANGUAGE'].lower().strip(), audio_whitelist):
-                m3u8 = m3u8.replace(line, '')
+                tag.removed = True
                 continue
 
             if subs_whitelist and attribs.get('TYPE') == 'SUBTITLES' and 'LANGUAGE' in attribs and not _lang_allowed(attribs['LANGUAGE'].lower().strip(), subs_whitelist):
-                m3u8 = m3u8.replace(line, '')
+                tag.removed = True
                 continue
 
             if not subs_forced and attribs.get('TYPE') == 'SUBTITLES' and attribs.get('FORCED','').upper() == 'YES':
-                m3u8 = m3u8.replace(line, '')
+                tag.removed = True
                 continue
 
             if not subs_non_forced and attribs.get('TYPE') == 'SUBTITLES' and attribs.get('FORCED','').upper() != 'YES':
-                m3u8 = m3u8.replace(line, '')
+                tag.removed = True
                 continue
 
             if not audio_description and attribs.get('TYPE') == 'AUDIO' and attribs.get('CHARACTERISTICS','').lower() == 'public.accessibility.describes-video':
-                m3u8 = m3u8.replace(line, '')
+                tag.removed = True
                 continue
 
-            groups[attribs['GROUP-ID']].append([attribs, line])
+            tag.dirty = True
+            groups[attribs['GROUP-ID']].append(attribs)
             if attribs.get('DEFAULT') == 'YES' and attribs['GROUP-ID'] not in default_groups:
                 default_groups.append(attribs['GROUP-ID'])
 
-        if default_language:
-            for group_id in groups:
-                if group_id in default_groups:
-                    continue
-
-                languages = []
-                for group in groups[group_id]:
-                    attribs, line = group
-
+        for group_id in groups:
+            languages = []
+            for attribs in groups[group_id]:
+                if default_language and group_id not in default_groups:
                     attribs['AUTOSELECT'] = 'NO'
                     attribs['DEFAULT']    = 'NO'
 
@@ -654,10 +806,6 @@ class RequestHandler(BaseHTTPRequestHandler):
 
                         languages.append(attribs['LANGUAGE'])
 
-        for group_id in groups:
-            for group in groups[group_id]:
-                attribs, line = group
-
                 # FIX es-ES > es / fr-FR > fr languages #
                 if 'LANGUAGE' in attribs:
                     split = attribs['LANGUAGE'].split('-')
@@ -665,55 +813,36 @@ class RequestHandler(BaseHTTPRequestHandler):
                         attribs['LANGUAGE'] = split[0]
                 #############################
 
-                new_line = '#EXT-X-MEDIA:' if attribs else ''
-                for key in attribs:
-                    new_line += u'{}="{}",'.format(key, attribs[key])
-
-                m3u8 = m3u8.replace(line, new_line.rstrip(','))
-
-        lines = list(m3u8.splitlines())
-        line1 = None
         streams, all_streams, urls, metas = [], [], [], []
-        for index, line in enumerate(lines):
-            if not line.strip():
-                continue
-
-            if line.startswith('#EXT-X-STREAM-INF'):
-                line1 = index
-            elif line1 and not line.startswith('#'):
-                attribs = _process_media(lines[line1])
+        for variant in playlist.variants:
+            attribs = variant.tag.attribs
 
-                codecs     = [x for x in attribs.get('CODECS', '').split(',') if x]
-                bandwidth  = int(attribs.get('BANDWIDTH') or 0)
-                resolution = attribs.get('RESOLUTION', '')
-                frame_rate = attribs.get('FRAME_RATE', '')
-
-                url = line
-                if '://' in url:
-                    url = '/'+'/'.join(url.lower().split('://')[1].split('/')[1:])
+            codecs     = [x for x in attribs.get('CODECS', '').split(',') if x]
+            bandwidth  = int(attribs.get('BANDWIDTH') or 0)
+            resolution = attribs.get('RESOLUTION', '')
+            frame_rate = attribs.get('FRAME_RATE', '')
 
-                stream = {'bandwidth': int(bandwidth), 'resolution': resolution, 'frame_rate': frame_rate, 'codecs': codecs, 'url': url, 'lines': [line1, index]}
-                all_streams.append(stream)
+            url = variant.uri.line
+            if '://' in url:
+                url = '/'+'/'.join(url.lower().split('://')[1].split('/')[1:])
 
-                if stream['url'] not in urls and lines[line1] not in metas:
-                    streams.append(stream)
-                    urls.append(stream['url'])
-                    metas.append(lines[line1])
+            stream = {'bandwidth': int(bandwidth), 'resolution': resolution, 'frame_rate': frame_rate, 'codecs': codecs, 'url': url, 'variant': variant}
+            all_streams.append(stream)
 
-                line1 = None
+            if stream['url'] not in urls and variant.tag.line not in metas:
+                streams.append(stream)
+                urls.append(stream['url'])
+                metas.append(variant.tag.line)
 
-        selected = self._quality_select(streams)
+        selected = self._untimed(self._quality_select, streams)
         if selected:
-            adjust = 0
             for stream in all_streams:
                 if stream['url'] != selected['url']:
-                    for index in stream['lines']:
-                        lines.pop(index-adjust)
-                        adjust += 1
+                    playlist.remove_variant(stream['variant'])
 
-        return '\n'.join(lines)
+        return playlist.output()
 
-    def _parse_m3u8(self, response):
+    def _parse_m3u8(self, response, url):
         m3u8 = response.stream.content.decode('utf8')
 
         is_master = False
@@ -734,7 +863,7 @@ class RequestHandler(BaseHTTPRequestHandler):
                 f.write(_m3u8)
 
         if is_master:
-            m3u8 = self._manifest_middleware(m3u8)
+            m3u8 = self._untimed(self._manifest_middleware, m3u8)
             m3u8 = self._parse_m3u8_master(m3u8, response.url)
 
         base_url = urljoin(response.url, '/')
@@ -742,6 +871,10 @@ class RequestHandler(BaseHTTPRequestHandler):
         m3u8 = re.sub(r'^/', r'{}'.format(base_url), m3u8, flags=re.I|re.M)
         m3u8 = re.sub(r'URI="/', r'URI="{}'.format(base_url), m3u8, flags=re.I|re.M)
 
+        if not is_master:
+            ## keyed by the urls the player will request (relative to the url it requested, not the upstream one)
+            self._prefetch_playlist(url, m3u8)
+
         ## Convert to proxy paths
         m3u8 = re.sub(r'(https?)://', r'{}\1://'.format(PROXY_PATH), m3u8, flags=re.I)
 
@@ -749,15 +882,33 @@ class RequestHandler(BaseHTTPRequestHandler):
 
         if ADDON_DEV:
             m3u8 = b"\n".join([ll.rstrip() for ll in m3u8.splitlines() if ll.strip()])
-            log.debug('Time taken: {}'.format(time.time() - start))
+            log.debug('Time taken: %s', time.time() - start)
             with open(xbmc.translatePath('special://temp/'+file_name+'-out.m3u8'), 'wb') as f:
                 f.write(m3u8)
 
         response.stream.content = m3u8
 
+    def _get_session(self):
+        with SESSION_LOCK:
+            if not self._session.get('session'):
+                # shared by all handler threads of this playback. Headers are passed per request so never mutate session headers
+                self._session['session'] = RawSession(pool_size=settings.getInt('proxy_pool_size', 10), idle_timeout=settings.getInt('proxy_idle_timeout', 30))
+                self._session['session'].headers.clear()
+                #self._session['session'].cookies.clear() #lets handle cookies in session
+
+            return self._session['session']
+
     def _proxy_request(self, method, url):
         self._session['redirecting'] = False
 
+        if self._plugin_data:
+            response = Response()
+            response.headers = dict(self._plugin_data.headers)
+            response.status_code = self._plugin_data.status_code
+            response.stream = ResponseStream(response)
+            response.stream.content = self._plugin_data.content
+            return response
+
         if not url.startswith('http'):
             response = Response()
             response.headers = {}
@@ -777,33 +928,41 @@ class RequestHandler(BaseHTTPRequestHandler):
             with open(xbmc.translatePath('special://temp/{}-request.txt').format(method.lower()), 'wb') as f:
                 f.write(self._post_data)
 
-        if not self._session.get('session'):
-            self._session['session'] = RawSession()
-        else:
-            self._session['session'].headers.clear()
-            #self._session['session'].cookies.clear() #lets handle cookies in session
+        session = self._get_session()
+
+        ## Apply the addon's url_subs.txt to segments, licences etc. (the manifest url already has them applied)
+        if self._session.get('url_subs') and url != self._session.get('manifest'):
+            url = url_sub(url, self._session['url_subs'])
 
         ## Fix any double // in url
         url = fix_url(url)
 
+        host = urlparse(url).netloc
+        start = time.time()
+
         retries = 3
         # some reason we get connection errors every so often when using a session. something to do with the socket
         for i in range(retries):
             try:
-                response = self._session['session'].request(method=method, url=url, headers=self._headers, data=self._post_data, allow_redirects=False, stream=True)
+                response = session.request(method=method, url=url, headers=self._headers, data=self._post_data, allow_redirects=False, stream=True)
             except ConnectionError as e:
                 if 'Connection aborted' not in str(e) or i == retries-1:
+                    METRICS.upstream_error(host, retries=i)
                     log.exception(e)
                     raise
             except Exception as e:
+                METRICS.upstream_error(host, retries=i)
                 log.exception(e)
                 raise
             else:
                 break
 
+        METRICS.upstream(host, response.status_code, time.time() - start, retries=i)
+
+        response.upstream_host = host
         response.stream = ResponseStream(response)
 
-        log.debug('{} OUT: {} ({})'.format(method.upper(), url, response.status_code))
+        log.debug('%s OUT: %s (%s)', method.upper(), url, response.status_code)
 
         headers = {}
         for header in response.headers:
@@ -828,7 +987,7 @@ class RequestHandler(BaseHTTPRequestHandler):
             response.stream.content = b''
 
         if 'set-cookie' in response.headers:
-            log.debug('set-cookie: {}'.format(response.headers['set-cookie']))
+            log.debug('set-cookie: %s', response.headers['set-cookie'])
             response.headers.pop('set-cookie') #lets handle cookies in session
             # base_url = urljoin(url, '/')
             # response.headers['set-cookie'] = re.sub(r'domain=([^ ;]*)', r'domain={}'.format(PROXY_HOST), response.headers['set-cookie'], flags=re.I)
@@ -854,21 +1013,37 @@ class RequestHandler(BaseHTTPRequestHandler):
     def _output_response(self, response):
         self._output_headers(response)
 
-        for chunk in response.stream.iter_content():
-            try:
-                self.wfile.write(chunk)
-            except Exception as e:
-                break
+        start = time.time()
+        size = response.stream.relay(self.wfile)
+        taken = time.time() - start
+
+        if size:
+            METRICS.relayed(getattr(response, 'upstream_host', None), size, taken)
+
+        if size and taken and log.debug_enabled():
+            log.debug('RELAY: %s bytes in %.3fs (%.2f MB/s)', size, taken, size / taken / 1048576)
+
+    def _output_stats(self):
+        self._plugin_headers = {}
+
+        response = Response()
+        response.status_code = 200
+        response.headers = {'content-type': 'application/json', 'cache-control': 'no-cache'}
+        response.stream = ResponseStream(response)
+        response.stream.content = json.dumps(METRICS.to_dict(), separators=(',', ':')).encode('utf8')
+
+        self._output_headers(response)
+        self.wfile.write(response.stream.content)
 
     def do_HEAD(self):
         url = self._get_url()
-        log.debug('HEAD IN: {}'.format(url))
+        log.debug('HEAD IN: %s', url)
         response = self._proxy_request('HEAD', url)
         self._output_response(response)
 
     def do_POST(self):
         url = self._get_url()
-        log.debug('POST IN: {}'.format(url))
+        log.debug('POST IN: %s', url)
         response = self._proxy_request('POST', url)
         self._output_response(response)
 
@@ -908,6 +1083,72 @@ class ResponseStream(object):
 
                 yield chunk
 
+    def relay(self, wfile):
+        raw = getattr(self._response, 'raw', None)
+        fp  = getattr(raw, '_fp', None)
+
+        # Passthrough content can go straight from the upstream socket into a reused buffer
+        if self._bytes is not None or not hasattr(fp, 'readinto'):
+            return self._relay_chunks(wfile)
+
+        size = 0
+        buf  = BUFFERS.get()
+        view = memoryview(buf)
+
+        try:
+            while True:
+                length = fp.readinto(buf)
+                if not length:
+                    break
+
+                try:
+                    wfile.write(view[:length])
+                except Exception as e:
+                    # client went away mid-stream. Don't return a half read connection to the pool
+                    raw.close()
+                    return size
+
+                size += length
+        finally:
+            BUFFERS.put(buf)
+
+        raw.release_conn()
+        return size
+
+    def _relay_chunks(self, wfile):
+        size = 0
+
+        for chunk in self.iter_content():
+            try:
+                wfile.write(chunk)
+            except Exception as e:
+                break
+
+            size += len(chunk)
+
+        return size
+
+class BufferPool(object):
+    def __init__(self, size, max_buffers):
+        self._size = size
+        self._max_buffers = max_buffers
+        self._free = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+
+        return bytearray(self._size)
+
+    def put(self, buf):
+        with self._lock:
+            if len(self._free) < self._max_buffers:
+                self._free.append(buf)
+
+BUFFERS = BufferPool(RELAY_BUFFER_SIZE, RELAY_MAX_BUFFERS)
+
 class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
     daemon_threads = True
 
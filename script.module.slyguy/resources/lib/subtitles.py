@@ -0,0 +1,368 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import threading
+from xml.parsers import expat
+
+from slyguy.log import log
+from slyguy.util import remove_file, FileIO
+
+CLOCK_RE  = re.compile(r'^(\d+):(\d{2}):(\d{2})(?:([.:])(\d+))?$')
+OFFSET_RE = re.compile(r'^([\d.]+)(h|ms|m|s|f|t)$')
+
+TTML_STYLES = (
+    ('fontStyle', 'italic', 'i'),
+    ('fontWeight', 'bold', 'b'),
+    ('textDecoration', 'underline', 'u'),
+)
+
+class UnsupportedTTML(Exception):
+    pass
+
+def _local(name):
+    return name.rsplit(' ', 1)[-1].rsplit(':', 1)[-1]
+
+def _timestamp(seconds):
+    ms = int(round(seconds * 1000))
+    ss, ms = divmod(ms, 1000)
+    mm, ss = divmod(ss, 60)
+    hh, mm = divmod(mm, 60)
+    return '%02d:%02d:%02d.%03d' % (hh, mm, ss, ms)
+
+def _hash(*args):
+    return hashlib.md5(json.dumps(args).encode('utf8')).hexdigest()
+
+def _escape(text):
+    return text.replace(u'&', u'&amp;').replace(u'<', u'&lt;').replace(u'>', u'&gt;')
+
+class TTMLToWebVTT(object):
+    """Streaming converter for simple profile TTML / DFXP.
+
+    Cues are written out as each <p> closes so the whole document is never held in memory.
+    Only <p> / <span> styles (italic, bold, underline) are converted. Anything that needs more
+    (timed containers, nested timing, styles / regions on body or div, regions, xml:space,
+    or elements other than span / br inside a p) raises UnsupportedTTML so the caller can fallback to pycaption.
+    """
+    def __init__(self, out):
+        self._out        = out
+        self._tick_rate  = 1
+        self._frame_rate = 30
+        self._styles     = {}
+        self._cue        = None
+        self._tags       = []
+        self._in_head    = False
+        self.count       = 0
+
+        self._parser = expat.ParserCreate(namespace_separator=' ')
+        self._parser.buffer_text = True
+        self._parser.StartElementHandler = self._start
+        self._parser.EndElementHandler = self._end
+        self._parser.CharacterDataHandler = self._chars
+
+        self._out.write(b'WEBVTT\n\n')
+
+    def feed(self, data):
+        self._parser.Parse(data, False)
+
+    def close(self):
+        self._parser.Parse(b'', True)
+
+    def _time(self, value):
+        value = value.strip()
+
+        match = CLOCK_RE.match(value)
+        if match:
+            hh, mm, ss, sep, frac = match.groups()
+            seconds = int(hh)*3600 + int(mm)*60 + int(ss)
+            if frac:
+                if sep == '.':
+                    seconds += float('0.' + frac)
+                else:
+                    seconds += int(frac) / float(self._frame_rate)
+            return seconds
+
+        match = OFFSET_RE.match(value)
+        if match:
+            number, metric = float(match.group(1)), match.group(2)
+            return {
+                'h': number * 3600,
+                'm': number * 60,
+                's': number,
+                'ms': number / 1000.0,
+                'f': number / float(self._frame_rate),
+                't': number / float(self._tick_rate),
+            }[metric]
+
+        raise UnsupportedTTML('Unsupported time: {}'.format(value))
+
+    def _tags_for(self, attrs):
+        style = {}
+        for style_id in attrs.get('style', '').split():
+            style.update(self._styles.get(style_id, {}))
+
+        for key in attrs:
+            if key != 'style':
+                style[key] = attrs[key]
+
+        return [tag for key, value, tag in TTML_STYLES if style.get(key) == value]
+
+    def _start(self, name, attrs):
+        name  = _local(name)
+        attrs = dict((_local(key), attrs[key]) for key in attrs)
+
+        if attrs.get('space') == 'preserve':
+            raise UnsupportedTTML('xml:space preserve')
+
+        if name == 'tt':
+            self._tick_rate = int(attrs.get('tickRate') or 1)
+            self._frame_rate = float(attrs.get('frameRate') or 30)
+
+            multiplier = attrs.get('frameRateMultiplier', '').split()
+            if len(multiplier) == 2:
+                self._frame_rate = self._frame_rate * float(multiplier[0]) / float(multiplier[1])
+
+        elif name == 'head':
+            self._in_head = True
+
+        elif self._in_head:
+            if name == 'style' and 'id' in attrs:
+                style = {}
+                for style_id in attrs.get('style', '').split():
+                    style.update(self._styles.get(style_id, {}))
+
+                style.update(attrs)
+                self._styles[attrs['id']] = style
+
+        elif name in ('body', 'div'):
+            if 'begin' in attrs or 'end' in attrs or 'dur' in attrs:
+                raise UnsupportedTTML('Timed {}'.format(name))
+
+            if 'style' in attrs or 'region' in attrs or [key for key, value, tag in TTML_STYLES if key in attrs]:
+                raise UnsupportedTTML('Styled {}'.format(name))
+
+        elif name == 'p':
+            if self._cue is not None or 'begin' not in attrs:
+                raise UnsupportedTTML('Untimed or nested p')
+
+            if 'region' in attrs:
+                raise UnsupportedTTML('p with region')
+
+            begin = self._time(attrs['begin'])
+            if 'end' in attrs:
+                end = self._time(attrs['end'])
+            elif 'dur' in attrs:
+                end = begin + self._time(attrs['dur'])
+            else:
+                raise UnsupportedTTML('p without end')
+
+            tags = self._tags_for(attrs)
+            self._cue = [begin, end, [u''.join(u'<{}>'.format(tag) for tag in tags)]]
+            self._tags.append(tags)
+
+        elif self._cue is None:
+            return
+
+        elif name == 'br':
+            self._cue[2].append(u'\n')
+            self._tags.append([])
+
+        elif name == 'span':
+            if 'begin' in attrs or 'end' in attrs or 'dur' in attrs:
+                raise UnsupportedTTML('Timed span')
+
+            if 'region' in attrs:
+                raise UnsupportedTTML('span with region')
+
+            tags = self._tags_for(attrs)
+            self._cue[2].append(u''.join(u'<{}>'.format(tag) for tag in tags))
+            self._tags.append(tags)
+
+        else:
+            raise UnsupportedTTML('Unsupported element in p: {}'.format(name))
+
+    def _end(self, name):
+        name = _local(name)
+
+        if name == 'head':
+            self._in_head = False
+            return
+
+        if self._cue is None:
+            return
+
+        tags = self._tags.pop()
+        self._cue[2].append(u''.join(u'</{}>'.format(tag) for tag in reversed(tags)))
+
+        if name == 'p':
+            self._write_cue()
+
+    def _chars(self, data):
+        if self._cue is not None:
+            self._cue[2].append(_escape(re.sub(r'\s+', u' ', data)))
+
+    def _write_cue(self):
+        begin, end, parts = self._cue
+        self._cue = None
+
+        lines = [line.strip() for line in u''.join(parts).split(u'\n')]
+        text = u'\n'.join([line for line in lines if line])
+        if not text:
+            return
+
+        if self.count:
+            self._out.write(b'\n')
+
+        self._out.write(u'{} --> {}\n{}\n'.format(_timestamp(begin), _timestamp(end), text).encode('utf8'))
+        self.count += 1
+
+class SubtitleCache(object):
+    """Converted subtitles on disk keyed by source url + etag.
+
+    The etag of the last conversion for a url is sent as If-None-Match so an
+    unchanged subtitle is only downloaded again as a 304.
+    """
+    def __init__(self, path, max_files=50):
+        self._path      = path
+        self._max_files = max_files
+        self._lock      = threading.Lock()
+        self._url_locks = {}
+
+        if not os.path.exists(self._path):
+            os.makedirs(self._path)
+
+    def _meta_path(self, url):
+        return os.path.join(self._path, '{}.json'.format(_hash(url)))
+
+    def _vtt_path(self, url, etag):
+        return os.path.join(self._path, '{}.vtt'.format(_hash(url, etag)))
+
+    def get(self, session, url, headers):
+        ## Only requests for the same url wait on each other (the download is the slow part)
+        with self._lock:
+            row = self._url_locks.setdefault(url, [threading.Lock(), 0])
+            row[1] += 1
+
+        try:
+            with row[0]:
+                return self._get(session, url, headers)
+        finally:
+            with self._lock:
+                row[1] -= 1
+                if not row[1]:
+                    self._url_locks.pop(url, None)
+
+    def _get(self, session, url, headers):
+        headers = dict((key, headers[key]) for key in headers if key not in ('range', 'if-none-match', 'if-modified-since', 'content-length'))
+
+        meta = {}
+        try:
+            with open(self._meta_path(url), 'r') as f:
+                meta = json.load(f)
+        except:
+            pass
+
+        if meta.get('etag') and os.path.exists(self._vtt_path(url, meta['etag'])):
+            headers['if-none-match'] = meta['etag']
+
+        resp = session.request('GET', url, headers=headers, stream=True)
+        if resp.status_code == 304:
+            resp.close()
+            log.debug('Subtitle not modified: %s', url)
+            return self._read(self._vtt_path(url, meta['etag']))
+
+        resp.raise_for_status()
+
+        etag = resp.headers.get('etag')
+        if meta.get('etag') and etag != meta['etag']:
+            remove_file(self._vtt_path(url, meta['etag']))
+            remove_file(self._meta_path(url))
+
+        vtt_path = self._vtt_path(url, etag)
+        src_path = vtt_path + '.src'
+        tmp_path = vtt_path + '.tmp'
+
+        try:
+            self._convert(resp, src_path, tmp_path)
+            shutil.move(tmp_path, vtt_path)
+        finally:
+            resp.close()
+            remove_file(src_path)
+            remove_file(tmp_path)
+
+        data = self._read(vtt_path)
+
+        if etag:
+            with open(self._meta_path(url), 'w') as f:
+                json.dump({'etag': etag, 'file': os.path.basename(vtt_path)}, f)
+
+            with self._lock:
+                self._prune()
+        else:
+            remove_file(vtt_path)
+
+        return data
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def _convert(self, resp, src_path, tmp_path):
+        converter = None
+
+        ## Stream into the fast TTML converter while keeping the source on disk for the fallback
+        with FileIO(src_path, 'wb') as src, FileIO(tmp_path, 'wb') as out:
+            for chunk in resp.iter_content(chunk_size=64*1024):
+                if converter is None and src.tell() == 0:
+                    head = chunk[:1024].lstrip()
+                    if head.startswith(b'\xef\xbb\xbf'):
+                        head = head[3:]
+
+                    if head.startswith(b'<') and b'<tt' in head:
+                        converter = TTMLToWebVTT(out)
+
+                src.write(chunk)
+
+                if converter:
+                    try:
+                        converter.feed(chunk)
+                    except Exception as e:
+                        log.debug('Fast TTML conversion failed (%s). Falling back to pycaption', e)
+                        converter = False
+
+            if converter:
+                try:
+                    converter.close()
+                    log.debug('Fast TTML conversion: %s cues', converter.count)
+                    return
+                except Exception as e:
+                    log.debug('Fast TTML conversion failed (%s). Falling back to pycaption', e)
+
+        from pycaption import detect_format, WebVTTWriter
+
+        with open(src_path, 'rb') as f:
+            data = f.read().decode('utf8')
+
+        reader = detect_format(data)
+        if not reader:
+            raise Exception('Unknown subtitle format')
+
+        data = WebVTTWriter().write(reader().read(data))
+        with open(tmp_path, 'wb') as f:
+            f.write(data.encode('utf8'))
+
+    def _prune(self):
+        files = [os.path.join(self._path, x) for x in os.listdir(self._path) if x.endswith('.json')]
+        if len(files) <= self._max_files:
+            return
+
+        files.sort(key=os.path.getmtime)
+        for meta_path in files[:len(files)-self._max_files]:
+            try:
+                with open(meta_path, 'r') as f:
+                    remove_file(os.path.join(self._path, json.load(f)['file']))
+            except:
+                pass
+
+            remove_file(meta_path)
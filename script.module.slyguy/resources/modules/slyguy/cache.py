@@ -1,15 +1,24 @@
+import random
+import threading
 from time import time
 from functools import wraps
+from collections import OrderedDict
 
 import peewee
+from six.moves import cPickle
 
 from . import database, settings, signals, gui, router
-from .constants import CACHE_TABLENAME, CACHE_EXPIRY, CACHE_CHECKSUM, CACHE_CLEAN_INTERVAL, CACHE_CLEAN_KEY, ROUTE_CLEAR_CACHE
+from .constants import CACHE_TABLENAME, CACHE_EXPIRY, CACHE_CHECKSUM, CACHE_CLEAN_INTERVAL, CACHE_CLEAN_KEY, CACHE_MEMORY_SIZE, CACHE_MEMORY_CHECK, CACHE_GENERATION_KEY, ROUTE_CLEAR_CACHE
 from .util import hash_6
 from .log import log
 from .language import _
 
-funcs   = []
+funcs      = []
+memory     = OrderedDict()
+lock       = threading.Lock()
+cleaned    = 0
+generation = None
+checked    = 0
 
 class Cache(database.Model):
     checksum = CACHE_CHECKSUM
@@ -20,6 +29,9 @@ class Cache(database.Model):
 
     class Meta:
         table_name = CACHE_TABLENAME
+        indexes = (
+            (('expires',), False),
+        )
 
 def enabled():
     return settings.getBool('use_cache', True)
@@ -69,7 +81,7 @@ def cached(*args, **kwargs):
             if not kwargs.pop('_skip_cache', False):
                 value = get(_key)
                 if value != None:
-                    log('Cache Hit: {}'.format(_key))
+                    log('Cache Hit: %s', _key)
                     return value
 
             value = f(*args, **kwargs)
@@ -83,30 +95,178 @@ def cached(*args, **kwargs):
 
     return lambda f: decorator(f, *args, **kwargs)
 
+## The memory tier keeps the pickled value of recent keys so a hit skips the query but still
+## returns a new copy (callers can mutate it). Every write changes the generation token in the KeyStore.
+## The memory is cleared when the token was changed by another process (checked every CACHE_MEMORY_CHECK seconds).
+def _check_generation(force=False):
+    global generation, checked
+
+    if not force and time() - checked < CACHE_MEMORY_CHECK:
+        return
+
+    try:
+        value = database.KeyStore.get(database.KeyStore.key == CACHE_GENERATION_KEY).value
+    except database.KeyStore.DoesNotExist:
+        value = None
+
+    with lock:
+        if value != generation:
+            memory.clear()
+            generation = value
+
+    checked = time()
+
+def _bump_generation():
+    global generation
+
+    # drop anything another process changed before taking over the token
+    _check_generation(force=True)
+
+    value = '{}{}'.format(int(time()), random.randint(0, 999999))
+    database.KeyStore.set(key=CACHE_GENERATION_KEY, value=value)
+
+    with lock:
+        generation = value
+
+def _memory_get(key):
+    _check_generation()
+
+    with lock:
+        row = memory.pop(key, None)
+        if row is None or row[1] <= time():
+            return None
+
+        memory[key] = row
+
+    return cPickle.loads(row[0])
+
+def _memory_set(key, value, expires):
+    value = cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL)
+
+    with lock:
+        memory.pop(key, None)
+        memory[key] = [value, expires]
+
+        while len(memory) > CACHE_MEMORY_SIZE:
+            memory.popitem(last=False)
+
 def get(key, default=None):
     if not enabled():
         return default
 
+    value = _memory_get(key)
+    if value is not None:
+        return value
+
     try:
-        return Cache.get(Cache.key == key, Cache.expires > time()).value
+        row = Cache.get(Cache.key == key, Cache.expires > time())
     except Cache.DoesNotExist:
         return default
 
+    _memory_set(key, row.value, row.expires)
+    return row.value
+
 def set(key, value, expires=CACHE_EXPIRY):
     expires = int(time() + expires)
-    Cache.set(key=key, value=value, expires=expires)
+
+    with database.db.atomic():
+        Cache.set(key=key, value=value, expires=expires)
+        _bump_generation()
+
+    _memory_set(key, value, expires)
+
+def get_many(keys):
+    """Returns {key: value} for the keys found. Missing keys are looked up in one query per batch"""
+    if not enabled():
+        return {}
+
+    values  = {}
+    missing = {}
+    for key in keys:
+        value = _memory_get(key)
+        if value is not None:
+            values[key] = value
+        else:
+            missing[hash_6(key)] = key
+
+    hashes = list(missing.keys())
+    batch_size = 500
+    for i in range(0, len(hashes), batch_size):
+        query = Cache.select(Cache.key, Cache.value).where(Cache.key.in_([missing[x] for x in hashes[i:i+batch_size]]), Cache.expires > time())
+        for row in query:
+            values[missing[row.key]] = row.value
+
+    return values
+
+def set_many(items, expires=CACHE_EXPIRY):
+    expires = int(time() + expires)
+    rows = [{'key': key, 'value': items[key], 'expires': expires} for key in items]
+
+    with database.db.atomic():
+        batch_size = max(1, int(999/len(Cache._meta.fields)))
+        for i in range(0, len(rows), batch_size):
+            Cache.replace_many(rows[i:i+batch_size]).execute()
+
+        _bump_generation()
+
+    for key in items:
+        if key in memory:
+            _memory_set(key, items[key], expires)
 
 def delete(key):
-    return Cache.delete_where(Cache.key == key)
+    with lock:
+        memory.pop(key, None)
+
+    with database.db.atomic():
+        deleted = Cache.delete_where(Cache.key == key)
+        _bump_generation()
+
+    return deleted
 
 def empty():
+    clear_memory()
     deleted = Cache.truncate()
-    log('Cache: Deleted {} Rows'.format(deleted))
+    _bump_generation()
+    log('Cache: Deleted %s Rows', deleted)
+
+@signals.on(signals.AFTER_RESET)
+def clear_memory():
+    global cleaned, generation, checked
+
+    with lock:
+        memory.clear()
+        generation = None
+
+    cleaned = 0
+    checked = 0
+
+@signals.on(signals.BEFORE_DISPATCH)
+def _before_dispatch():
+    global checked
+    # check for changes by other processes on the first get of a dispatch
+    checked = 0
 
 @signals.on(signals.BEFORE_DISPATCH)
 def remove_expired():
-    deleted = Cache.delete_where(Cache.expires < int(time()))
-    log('Cache: Deleted {} Expired Rows'.format(deleted))
+    global cleaned
+
+    _time = int(time())
+    if _time < cleaned + CACHE_CLEAN_INTERVAL:
+        return
+
+    try:
+        cleaned = int(database.KeyStore.get(database.KeyStore.key == CACHE_CLEAN_KEY).value)
+    except database.KeyStore.DoesNotExist:
+        cleaned = 0
+
+    if _time < cleaned + CACHE_CLEAN_INTERVAL:
+        return
+
+    deleted = Cache.delete_where(Cache.expires < _time)
+    database.KeyStore.set(key=CACHE_CLEAN_KEY, value=_time)
+    cleaned = _time
+
+    log('Cache: Deleted %s Expired Rows', deleted)
 
 @router.route(ROUTE_CLEAR_CACHE)
 def clear_cache(key, **kwargs):
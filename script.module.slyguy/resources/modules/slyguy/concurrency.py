@@ -0,0 +1,276 @@
+import time
+import threading
+from collections import deque
+
+from kodi_six import xbmc
+from six.moves import queue
+
+from . import signals
+from .constants import DEFAULT_WORKERS, POOL_MAX_WORKERS
+from .exceptions import Exit, TaskCancelled, TaskTimeout
+from .log import log
+
+## One pool of worker threads shared by everything in the process (created on first use).
+## POOL_MAX_WORKERS caps the threads, so nested / parallel map calls queue instead of
+## opening more connections. Tasks submitted from a pool thread run inline in that thread
+## so a task waiting on its own sub tasks can never deadlock the pool.
+## Waits return early with Exit when Kodi is shutting down.
+## The pool is shutdown after each dispatch. Anything still submitting to it after that gets cancelled tasks.
+
+WAIT_INTERVAL = 0.2
+
+PENDING   = 0
+RUNNING   = 1
+FINISHED  = 2
+CANCELLED = 3
+
+_monitor = None
+
+def _abort_requested():
+    global _monitor
+
+    if _monitor is None:
+        _monitor = xbmc.Monitor()
+
+    return _monitor.abortRequested()
+
+def _wait(event, timeout=None):
+    end = time.time() + timeout if timeout is not None else None
+
+    while True:
+        wait = WAIT_INTERVAL if end is None else min(WAIT_INTERVAL, max(end - time.time(), 0))
+        if event.wait(wait):
+            return
+
+        if _abort_requested():
+            raise Exit()
+
+        if end is not None and time.time() >= end:
+            raise TaskTimeout()
+
+class Future(object):
+    def __init__(self, func, args=None, kwargs=None):
+        self._func      = func
+        self._args      = args or ()
+        self._kwargs    = kwargs or {}
+        self._state     = PENDING
+        self._result    = None
+        self._exception = None
+        self._callbacks = []
+        self._event     = threading.Event()
+        self._lock      = threading.Lock()
+
+    def _run(self):
+        with self._lock:
+            if self._state != PENDING:
+                return
+            self._state = RUNNING
+
+        result, exception = None, None
+        try:
+            result = self._func(*self._args, **self._kwargs)
+        except BaseException as e:
+            # includes SystemExit / KeyboardInterrupt so waiters are always woken. result() re-raises it
+            exception = e
+
+        self._finish(FINISHED, result, exception)
+
+    def _finish(self, state, result, exception):
+        with self._lock:
+            self._state     = state
+            self._result    = result
+            self._exception = exception
+            callbacks = self._callbacks
+            self._callbacks = []
+            self._event.set()
+
+        for callback in callbacks:
+            callback(self)
+
+    def cancel(self):
+        """Cancels the task if it has not started. Running tasks can't be interrupted"""
+        with self._lock:
+            if self._state != PENDING:
+                return self._state == CANCELLED
+
+        self._finish(CANCELLED, None, TaskCancelled())
+        return True
+
+    def cancelled(self):
+        return self._state == CANCELLED
+
+    def done(self):
+        return self._event.is_set()
+
+    def add_done_callback(self, callback):
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+
+        callback(self)
+
+    def exception(self, timeout=None):
+        _wait(self._event, timeout)
+        return self._exception
+
+    def result(self, timeout=None):
+        _wait(self._event, timeout)
+        if self._exception is not None:
+            raise self._exception
+
+        return self._result
+
+class Pool(object):
+    def __init__(self, max_workers=POOL_MAX_WORKERS):
+        self._max_workers = max_workers
+        self._queue       = queue.Queue()
+        self._threads     = []
+        self._idle        = 0
+        self._closed      = False
+        self._lock        = threading.Lock()
+        self._local       = threading.local()
+
+    def in_worker(self):
+        return getattr(self._local, 'pool', None) is self
+
+    def submit(self, func, *args, **kwargs):
+        future = Future(func, args, kwargs)
+
+        if self.in_worker():
+            future._run()
+            return future
+
+        with self._lock:
+            if self._closed:
+                future.cancel()
+                return future
+
+            self._queue.put(future)
+
+            if self._idle < self._queue.qsize() and len(self._threads) < self._max_workers:
+                thread = threading.Thread(target=self._worker)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+        return future
+
+    def _worker(self):
+        self._local.pool = self
+
+        while True:
+            with self._lock:
+                self._idle += 1
+
+            future = self._queue.get()
+
+            with self._lock:
+                self._idle -= 1
+
+            if future is None:
+                break
+
+            future._run()
+
+    def imap(self, func, iterable, workers=DEFAULT_WORKERS, timeout=None):
+        """Yields func(item) for each item in order as soon as each result is ready.
+
+        At most workers tasks run at once and results are only buffered a few batches ahead,
+        so a caller that stops early doesn't run the rest. timeout is the seconds to wait for each result.
+        Stopping (or an exception) cancels the tasks that have not started.
+        """
+        items   = iter(iterable)
+        futures = deque()
+        changed = threading.Event()
+        max_buffered = workers * 4
+
+        def on_done(future):
+            changed.set()
+
+        def fill():
+            while len(futures) < max_buffered and len([f for f in futures if not f.done()]) < workers:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+
+                future = self.submit(func, item)
+                future.add_done_callback(on_done)
+                futures.append(future)
+
+        try:
+            fill()
+            while futures:
+                head = futures[0]
+                end  = time.time() + timeout if timeout is not None else None
+
+                while True:
+                    changed.clear()
+                    fill()
+                    if head.done():
+                        break
+
+                    _wait(changed, None if end is None else end - time.time())
+
+                futures.popleft()
+                yield head.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def map(self, func, iterable, workers=DEFAULT_WORKERS, timeout=None):
+        return list(self.imap(func, iterable, workers=workers, timeout=timeout))
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            pending = []
+            while True:
+                try:
+                    pending.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for thread in self._threads:
+                self._queue.put(None)
+
+            self._threads = []
+
+        for future in pending:
+            if future:
+                future.cancel()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = Pool()
+
+        return _pool
+
+@signals.on(signals.AFTER_DISPATCH)
+def shutdown():
+    global _pool
+
+    with _pool_lock:
+        if _pool is None or _pool.in_worker():
+            return
+
+        _pool.shutdown()
+        _pool = None
+
+    log.debug('Worker pool shutdown')
+
+def submit(func, *args, **kwargs):
+    return get_pool().submit(func, *args, **kwargs)
+
+def imap(func, iterable, workers=DEFAULT_WORKERS, timeout=None):
+    return get_pool().imap(func, iterable, workers=workers, timeout=timeout)
+
+def map(func, iterable, workers=DEFAULT_WORKERS, timeout=None):
+    return get_pool().map(func, iterable, workers=workers, timeout=timeout)
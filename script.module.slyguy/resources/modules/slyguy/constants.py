@@ -16,6 +16,7 @@ ADDON_DEV      = bool(int(os.environ.get('ADDON_DEV', '0')))
 
 COMMON_ADDON_ID = 'script.module.slyguy'
 COMMON_ADDON    = xbmcaddon.Addon(COMMON_ADDON_ID)
+COMMON_ADDON_VERSION = COMMON_ADDON.getAddonInfo('version')
 
 try:
     KODI_VERSION = int(xbmc.getInfoLabel("System.BuildVersion").split('.')[0])
@@ -33,6 +34,9 @@ DB_PRAGMAS      = {
     'synchronous': 0
 }
 DB_TABLENAME = '_db'
+DB_MAINTENANCE_KEY      = '_db_maintenance'
+DB_MAINTENANCE_INTERVAL = (60*60*24) # 24 Hours
+DB_VACUUM_FREE_RATIO    = 0.25 # Vacuum once a quarter of the file is free pages
 ###################
 
 ##### USERDATA ####
@@ -45,8 +49,14 @@ CACHE_CHECKSUM       = ADDON_VERSION # Recreates cache when new addon version
 CACHE_EXPIRY         = (60*60*24) # 24 Hours
 CACHE_CLEAN_INTERVAL = (60*60*4)  # 4 Hours
 CACHE_CLEAN_KEY      = '_cache_cleaned'
+CACHE_MEMORY_SIZE    = 100 # Items kept in-process in front of the db
+CACHE_MEMORY_CHECK   = 5   # Seconds between checking if another process changed the cache
+CACHE_GENERATION_KEY = '_cache_generation'
 #################
 
+MD5_CACHE_FILE = os.path.join(ADDON_PROFILE, '.md5sums')
+MD5_CACHE_SIZE = 100 # Files checksums are kept for
+
 IPTV_MERGE_ID        = 'plugin.program.iptv.merge'
 
 #### ROUTING ####
@@ -72,6 +82,7 @@ ROUTE_BOOKMARKS        = '_bookmarks'
 ROUTE_MOVE_BOOKMARK    = '_move_bookmark'
 ROUTE_RENAME_BOOKMARK  = '_name_bookmark'
 ROUTE_WEBVTT           = '_webvtt'
+ROUTE_PROFILER         = '_profiler'
 #################
 
 #### INPUTSTREAM ADAPTIVE #####
@@ -94,6 +105,7 @@ NOARG = object()
 #### LOG #####
 LOG_ID     = ADDON_ID
 LOG_FORMAT = u'%(name)s - %(message)s'
+LOG_LEVEL_CHECK = 10 #seconds between checking kodi's debug log setting
 #################
 
 #### GUI ####
@@ -121,13 +133,24 @@ WIDEVINE_PSSH = bytearray([112, 115, 115, 104])
 #DEFAULT_USERAGENT = xbmc.getUserAgent()
 DEFAULT_USERAGENT = 'okhttp/3.4.1'
 DEFAULT_WORKERS   = 5
+POOL_MAX_WORKERS  = 10
 
 #### BOOKMARKS #####
 BOOKMARK_FILE = os.path.join(ADDON_PROFILE, 'bookmarks.json')
 
+## URL SUBS ##
+URL_SUBS_FILE  = os.path.join(ADDON_PROFILE, 'url_subs.txt')
+URL_SUBS_CHECK = 2 #seconds between checking the file for changes
+
+## PROFILER ##
+PROFILER_FILE       = os.path.join(ADDON_PROFILE, 'profiler.jsonl')
+PROFILER_STATS_FILE = os.path.join(ADDON_PROFILE, 'profiler_stats.txt')
+PROFILER_MAX_TRACES = 200
+
 ## PROXY ##
 PROXY_PORT = 52103
 PROXY_HOST = '127.0.0.1'
+PROXY_HOOKS_CHECK = 10 #seconds between checking an addon's proxy_hooks.py for changes
 
 # https://github.com/python/cpython/blob/master/Lib/shutil.py#L42
 CHUNK_SIZE = 1024 * 1024 if os.name == 'nt' else 64 * 1024
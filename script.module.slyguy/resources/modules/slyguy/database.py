@@ -1,6 +1,8 @@
 import os
 import json
 import codecs
+import hashlib
+from time import time
 
 import peewee
 from six.moves import cPickle
@@ -8,7 +10,7 @@ from six.moves import cPickle
 from . import userdata, signals
 from .log import log
 from .util import hash_6
-from .constants import DB_PATH, DB_PRAGMAS, DB_MAX_INSERTS, DB_TABLENAME, ADDON_DEV
+from .constants import DB_PATH, DB_PRAGMAS, DB_MAX_INSERTS, DB_TABLENAME, DB_MAINTENANCE_KEY, DB_MAINTENANCE_INTERVAL, DB_VACUUM_FREE_RATIO, ADDON_DEV, ADDON_VERSION, COMMON_ADDON_VERSION
 
 path = os.path.dirname(DB_PATH)
 if not os.path.exists(path):
@@ -132,7 +134,20 @@ class KeyStore(Model):
         table_name = DB_TABLENAME
 
 tables = [KeyStore]
+
+def schema_version():
+    # Table schemas only change with code, so the addon versions + registered tables stand in for the full per table checksums
+    key = [ADDON_VERSION, COMMON_ADDON_VERSION]
+    for table in tables:
+        key.append([table.table_name(), table.checksum])
+
+    return int(hashlib.md5(u'{}'.format(key).encode('utf8')).hexdigest()[:7], 16)
+
 def check_tables():
+    version = schema_version()
+    if not ADDON_DEV and db.pragma('user_version') == version:
+        return
+
     with db.atomic():
         for table in tables:
             key      = table.table_name()
@@ -146,16 +161,63 @@ def check_tables():
 
             KeyStore.set(key=key, value=checksum)
 
+    db.pragma('user_version', version)
+
 @signals.on(signals.AFTER_RESET)
 def delete():
     close()
     if os.path.exists(DB_PATH):
         os.remove(DB_PATH)
 
+class Maintenance(object):
+    last_run = 0
+
+maintenance = Maintenance()
+
+def run_maintenance(force=False):
+    _time = int(time())
+    if not force and _time < maintenance.last_run + DB_MAINTENANCE_INTERVAL:
+        return None
+
+    if not force:
+        try:
+            maintenance.last_run = int(KeyStore.get(KeyStore.key == DB_MAINTENANCE_KEY).value)
+        except KeyStore.DoesNotExist:
+            maintenance.last_run = 0
+
+        if _time < maintenance.last_run + DB_MAINTENANCE_INTERVAL:
+            return None
+
+    page_count = db.execute_sql('PRAGMA page_count').fetchone()[0]
+    free_count = db.execute_sql('PRAGMA freelist_count').fetchone()[0]
+
+    if page_count and float(free_count) / page_count >= DB_VACUUM_FREE_RATIO:
+        action = 'VACUUM'
+    else:
+        action = 'PRAGMA optimize'
+
+    db.execute_sql(action)
+    KeyStore.set(key=DB_MAINTENANCE_KEY, value=_time)
+    maintenance.last_run = _time
+
+    return '{} ({}/{} free pages)'.format(action, free_count, page_count)
+
 @signals.on(signals.ON_CLOSE)
 def close():
-    try:  db.execute_sql('VACUUM')
-    except: log.debug('Failed to vacuum db')
+    start = time()
+
+    try:
+        action = run_maintenance()
+    except Exception as e:
+        log.debug('Failed to run db maintenance')
+        log.exception(e)
+        action = None
+
+    if action:
+        log.debug('DB Maintenance: %s took %.3fs', action, time() - start)
+    else:
+        log.debug('DB Maintenance: skipped (%.3fs)', time() - start)
+
     db.close()
 
 @signals.on(signals.BEFORE_DISPATCH)
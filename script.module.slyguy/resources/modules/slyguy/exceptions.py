@@ -7,6 +7,12 @@ class Exit(Exception):
 class FailedPlayback(Exception):
     pass
 
+class TaskCancelled(Exception):
+    pass
+
+class TaskTimeout(Exception):
+    pass
+
 class Error(Exception):
     def __init__(self, message='', heading=None):
         self.message = message
@@ -0,0 +1,229 @@
+import re
+import hashlib
+import threading
+
+from . import cache
+from .util import hash_6
+from .log import log
+
+STRING_RE  = re.compile(r'("""[\s\S]*?"""|"(?:\\.|[^"\\])*")')
+COMMENT_RE = re.compile(r'#[^\n\r]*')
+SPACE_RE   = re.compile(r'\s+')
+PUNCT_RE   = re.compile(r'\s*([{}()\[\]:,=!|@$])\s*')
+
+ENTITY_KEY      = 'graphql.entity.{}'
+QUERY_CACHE_KEY = 'graphql.query.{}'
+
+PERSISTED_NOT_FOUND     = 'PersistedQueryNotFound'
+PERSISTED_NOT_SUPPORTED = 'PersistedQueryNotSupported'
+
+_queries = {}
+_lock = threading.Lock()
+_no_persisted = set()
+
+def minify(query):
+    parts = STRING_RE.split(query)
+
+    # odd parts are string literals and are kept as-is
+    for i in range(0, len(parts), 2):
+        part = COMMENT_RE.sub('', parts[i])
+        part = SPACE_RE.sub(' ', part)
+        parts[i] = PUNCT_RE.sub(r'\1', part)
+
+    return ''.join(parts).strip()
+
+class Query(object):
+    """A GraphQL query minified and hashed once.
+
+    Define queries with it at module level so the work is done at import, eg.
+        LOGIN = Query('''query Login($email: String!) { ... }''')
+    """
+    __slots__ = ['text', 'hash']
+
+    def __init__(self, query):
+        self.text = minify(query)
+        self.hash = hashlib.sha256(self.text.encode('utf8')).hexdigest()
+
+    def __str__(self):
+        return self.text
+
+def get_query(query):
+    if isinstance(query, Query):
+        return query
+
+    with _lock:
+        if query not in _queries:
+            _queries[query] = Query(query)
+
+        return _queries[query]
+
+def _error_codes(data):
+    codes = []
+    for error in (data or {}).get('errors') or []:
+        codes.append(error.get('message'))
+        codes.append((error.get('extensions') or {}).get('code'))
+    return codes
+
+## NORMALIZED CACHE ##
+## Scalar fields of objects with a __typename and id are stored once as entities ("Type:id").
+## Cached responses keep their own shape and reference the entities, so they are always
+## rebuilt with the newest copy of each show / episode from any query that returned it.
+## Fields are merged by name, so don't cache queries selecting the same entity field with different args.
+REF_KEY      = '__ref'
+SCALARS_KEY  = '__scalars'
+CHILDREN_KEY = '__children'
+
+def _is_scalar(value):
+    if isinstance(value, list):
+        return all(_is_scalar(x) for x in value)
+
+    return not isinstance(value, dict)
+
+def _normalize(value, entities):
+    if isinstance(value, list):
+        return [_normalize(x, entities) for x in value]
+
+    if not isinstance(value, dict):
+        return value
+
+    if not value.get('__typename') or value.get('id') is None:
+        return dict((key, _normalize(value[key], entities)) for key in value)
+
+    ref = u'{}:{}'.format(value['__typename'], value['id'])
+    entity = entities.setdefault(ref, {})
+    node = {REF_KEY: ref, SCALARS_KEY: [], CHILDREN_KEY: {}}
+
+    for key in value:
+        if _is_scalar(value[key]):
+            entity[key] = value[key]
+            node[SCALARS_KEY].append(key)
+        else:
+            node[CHILDREN_KEY][key] = _normalize(value[key], entities)
+
+    return node
+
+def _refs(value, refs):
+    if isinstance(value, list):
+        for x in value:
+            _refs(x, refs)
+
+    elif isinstance(value, dict):
+        if REF_KEY in value:
+            refs.add(value[REF_KEY])
+            value = value[CHILDREN_KEY]
+
+        for key in value:
+            _refs(value[key], refs)
+
+    return refs
+
+def _denormalize(value, entities):
+    if isinstance(value, list):
+        return [_denormalize(x, entities) for x in value]
+
+    if not isinstance(value, dict):
+        return value
+
+    if REF_KEY not in value:
+        return dict((key, _denormalize(value[key], entities)) for key in value)
+
+    entity = entities[value[REF_KEY]]
+    data = dict((key, entity[key]) for key in value[SCALARS_KEY])
+    for key in value[CHILDREN_KEY]:
+        data[key] = _denormalize(value[CHILDREN_KEY][key], entities)
+
+    return data
+
+def _load_entities(refs):
+    keys = dict((ENTITY_KEY.format(ref), ref) for ref in refs)
+    rows = cache.get_many(list(keys.keys()))
+    return dict((keys[key], rows[key]) for key in rows)
+
+def _cache_get(key):
+    normalized = cache.get(key)
+    if normalized is None:
+        return None
+
+    refs = _refs(normalized, set())
+    entities = _load_entities(refs)
+    if len(entities) != len(refs):
+        log.debug('GraphQL Cache: %s entities expired', len(refs) - len(entities))
+        return None
+
+    try:
+        data = _denormalize(normalized, entities)
+    except KeyError:
+        return None
+
+    log.debug('GraphQL Cache Hit: %s (%s entities)', key, len(entities))
+    return data
+
+def _cache_set(key, resp, expires):
+    entities = {}
+    normalized = _normalize(resp, entities)
+
+    ## merge with stored entities so fields selected by other queries are kept
+    stored = _load_entities(entities.keys())
+    items = {}
+    for ref in entities:
+        entity = stored.get(ref) or {}
+        entity.update(entities[ref])
+        items[ENTITY_KEY.format(ref)] = entity
+
+    items[key] = normalized
+    cache.set_many(items, expires)
+
+# graphql.request(session, API_URL, queries.LOGIN, variables)
+def request(session, url, query, variables=None, persisted=False, expires=None, cache_key=None, **kwargs):
+    """Posts a query and returns the json response.
+
+    With persisted=True the query is first sent as an automatic persisted query
+    (only its sha256 hash). If the server does not know the hash the full query is sent,
+    and if it does not support persisted queries the url is not tried with them again.
+
+    With expires (seconds) successful responses are kept in the normalized cache.
+    cache_key is added to the cache key for anything else the response depends on (eg. profile).
+    """
+    query = get_query(query)
+
+    key = None
+    if expires and cache.enabled():
+        key = QUERY_CACHE_KEY.format(hash_6([url, query.hash, variables, cache_key]))
+        resp = _cache_get(key)
+        if resp is not None:
+            return resp
+
+    resp = _request(session, url, query, variables, persisted, **kwargs)
+
+    if key and resp.get('data') and not resp.get('errors'):
+        try:
+            _cache_set(key, resp, expires)
+        except Exception as e:
+            log.debug('GraphQL Cache: Failed to store')
+            log.exception(e)
+
+    return resp
+
+def _request(session, url, query, variables=None, persisted=False, **kwargs):
+    data = {
+        'variables': variables or {},
+    }
+
+    if persisted and url not in _no_persisted:
+        data['extensions'] = {'persistedQuery': {'version': 1, 'sha256Hash': query.hash}}
+
+        resp = session.post(url, json=data, **kwargs).json()
+        codes = _error_codes(resp)
+
+        if PERSISTED_NOT_FOUND in codes:
+            # send again with the full query so the server stores it against the hash
+            log.debug('GraphQL persisted query not found: %s', query.hash)
+        elif PERSISTED_NOT_SUPPORTED in codes or (resp.get('errors') and not resp.get('data')):
+            log.debug('GraphQL persisted queries not supported: %s', url)
+            _no_persisted.add(url)
+            data.pop('extensions')
+        else:
+            return resp
+
+    data['query'] = query.text
+    return session.post(url, json=data, **kwargs).json()
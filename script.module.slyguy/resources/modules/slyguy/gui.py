@@ -1,3 +1,4 @@
+import os
 import sys
 import json
 import traceback
@@ -379,6 +380,7 @@ class Item(object):
                 'subtitles': [],
                 'path_subs': {},
                 'addon_id': ADDON_ID,
+                'url_subs': URL_SUBS_FILE if os.path.exists(URL_SUBS_FILE) else None,
                 'quality': QUALITY_DISABLED,
                 'manifest_middleware': None,
                 'type': None,
@@ -402,7 +404,7 @@ class Item(object):
 
             set_kodi_string('_slyguy_quality', json.dumps(proxy_data))
 
-            if proxy_data['manifest_middleware'] or proxy_data['subtitles'] or (proxy_data['quality'] not in (QUALITY_DISABLED, QUALITY_SKIP) and proxy_data['type']):
+            if proxy_data['manifest_middleware'] or proxy_data['subtitles'] or proxy_data['url_subs'] or (proxy_data['quality'] not in (QUALITY_DISABLED, QUALITY_SKIP) and proxy_data['type']):
                 self.use_proxy = True
 
             self.path = get_url(self.path)
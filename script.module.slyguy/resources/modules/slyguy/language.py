@@ -158,6 +158,8 @@ class BaseLanguage(object):
     XZ_ERROR                    = 32118
     INSTALLING_APT_IA           = 32119
     WINDOWS_VMP_REQUIRED        = 32120
+    PROFILER_SUMMARY            = 32127
+    PROFILER_NO_TRACES          = 32128
 
     def __getattribute__(self, name):
         attr = object.__getattribute__(self, name)
@@ -1,13 +1,43 @@
+import time
 import logging
 
 from kodi_six import xbmc
 
-from .constants import LOG_ID, LOG_FORMAT
+from .constants import LOG_ID, LOG_FORMAT, LOG_LEVEL_CHECK, ADDON_DEV
+
+## Debug messages are only built when Kodi's debug logging is on (or ADDON_DEV).
+## Pass args instead of formatting so nothing is done when it's off, eg.
+##   log.debug('GET IN: %s', url)
+## and guard anything costly to build with
+##   if log.debug_enabled(): ...
 
 class Logger(logging.Logger):
+    _level_checked = 0
+
     def __call__(self, *args, **kwargs):
         self.debug(*args, **kwargs)
 
+    def isEnabledFor(self, level):
+        if time.time() - self._level_checked > LOG_LEVEL_CHECK:
+            self.refresh_level()
+
+        return logging.Logger.isEnabledFor(self, level)
+
+    def debug_enabled(self):
+        return self.isEnabledFor(logging.DEBUG)
+
+    def refresh_level(self):
+        self._level_checked = time.time()
+
+        try:
+            debug = ADDON_DEV or xbmc.getCondVisibility('System.GetBool(debug.showloginfo)')
+        except:
+            debug = True
+
+        level = logging.DEBUG if debug else logging.INFO
+        if level != self.level:
+            self.setLevel(level)
+
 class LoggerHandler(logging.StreamHandler):
     LEVELS = {
         logging.NOTSET   : xbmc.LOGNONE,
@@ -32,4 +62,4 @@ handler.setFormatter(formatter)
 
 log = logging.getLogger(LOG_ID)
 log.handlers = [handler]
-log.setLevel(logging.DEBUG)
\ No newline at end of file
+log.refresh_level()
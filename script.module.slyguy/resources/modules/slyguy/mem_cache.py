@@ -39,7 +39,7 @@ def set(key, value, expires=CACHE_EXPIRY):
     elif expires != None:
         expires = int(time() + expires)
 
-    log('Cache Set: {}'.format(key))
+    log('Cache Set: %s', key)
     cache.data[key] = [value, expires]
 
 def get(key, default=None):
@@ -52,7 +52,7 @@ def get(key, default=None):
         cache.data.pop(key, None)
         return default
     else:
-        log('Cache Hit: {}'.format(key))
+        log('Cache Hit: %s', key)
         return row[0]
 
 def delete(key):
@@ -61,7 +61,7 @@ def delete(key):
 def empty():
     deleted = len(cache.data)
     cache.data.clear()
-    log('Mem Cache: Deleted {} Rows'.format(deleted))
+    log('Mem Cache: Deleted %s Rows', deleted)
 
 def key_for(f, *args, **kwargs):
     func_name = f.__name__ if callable(f) else f
@@ -130,7 +130,7 @@ def remove_expired():
         cache.data.pop(key, None)
 
     if delete:
-        log('Mem Cache: Deleted {} Expired Rows'.format(len(delete)))
+        log('Mem Cache: Deleted %s Expired Rows', len(delete))
 
     if settings.getBool('persist_cache', True):
         set_kodi_string(cache_key, cPickle.dumps(cache.data, protocol=0).decode('latin1'))
@@ -11,7 +11,7 @@ from pycaption import detect_format, WebVTTWriter
 from kodi_six import xbmc, xbmcplugin
 from six.moves.urllib.parse import quote
 
-from . import router, gui, settings, userdata, inputstream, signals, migrate, bookmarks
+from . import router, gui, settings, userdata, inputstream, signals, migrate, bookmarks, profiler
 from .constants import *
 from .log import log
 from .language import _
@@ -276,6 +276,10 @@ def _webvtt(url, _data_path, _headers, **kwargs):
 
     return _data_path + '|content-type=text/vtt'
 
+@route(ROUTE_PROFILER)
+def _profiler(**kwargs):
+    gui.text(profiler.summary() or _.PROFILER_NO_TRACES, heading=_.PROFILER_SUMMARY)
+
 @route(ROUTE_RESET)
 def _reset(**kwargs):
     if not gui.yes_no(_.PLUGIN_RESET_YES_NO):
@@ -457,6 +461,9 @@ class Item(gui.Item):
             data.update(self.callback)
             set_kodi_string('_slyguy_play_callback', json.dumps(data))
 
+        ## licence / plugin calls Kodi makes straight after resolving need the latest userdata
+        userdata.flush()
+
         if handle > 0:
             xbmcplugin.setResolvedUrl(handle, True, li)
         else:
@@ -492,6 +499,7 @@ class Folder(object):
                     is_folder = False,
                 ))
 
+        start = time.time()
         for item in items:
             if self.thumb and not item.art.get('thumb'):
                 item.art['thumb'] = self.thumb
@@ -501,6 +509,7 @@ class Folder(object):
 
             li = item.get_li()
             xbmcplugin.addDirectoryItem(handle, item.path, li, item.is_folder)
+        profiler.record(profiler.TYPE_LISTITEM, len(items), time.time() - start)
 
         if self.content: xbmcplugin.setContent(handle, self.content)
         if self.title: xbmcplugin.setPluginCategory(handle, self.title)
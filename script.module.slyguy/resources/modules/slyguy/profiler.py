@@ -0,0 +1,161 @@
+import io
+import json
+import time
+import codecs
+from contextlib import contextmanager
+
+from six import StringIO
+
+from .constants import PROFILER_FILE, PROFILER_STATS_FILE, PROFILER_MAX_TRACES
+from .log import log
+
+## Opt-in timings for each plugin invocation (Advanced > Profile Plugin Routes in SlyGuy Common).
+## A trace is one json line in the addon profile's profiler.jsonl (last PROFILER_MAX_TRACES kept):
+##   {"route": .., "time": .., "total": ms, "events": [[type, name, ms], ..]}
+## Recorded events are signal handlers, http requests, the route itself and list item builds.
+## The _profiler route summarises the slowest routes.
+
+TYPE_SIGNAL   = 'signal'
+TYPE_HTTP     = 'http'
+TYPE_ROUTE    = 'route'
+TYPE_LISTITEM = 'listitems'
+
+_trace = None
+
+def active():
+    return _trace is not None
+
+def start(url):
+    global _trace
+
+    from .settings import common_settings
+    if not common_settings.getBool('profiler', False):
+        _trace = None
+        return
+
+    _trace = {
+        'url': url,
+        'route': None,
+        'time': int(time.time()),
+        'start': time.time(),
+        'events': [],
+        'cprofile': common_settings.getBool('profiler_cprofile', False),
+    }
+
+def record(_type, name, seconds):
+    if _trace is not None:
+        _trace['events'].append([_type, name, int(seconds * 1000)])
+
+@contextmanager
+def timer(_type, name):
+    if _trace is None:
+        yield
+        return
+
+    start = time.time()
+    try:
+        yield
+    finally:
+        record(_type, name, time.time() - start)
+
+def run_route(name, function, **params):
+    if _trace is None:
+        return function(**params)
+
+    _trace['route'] = name
+
+    with timer(TYPE_ROUTE, name):
+        if not _trace['cprofile']:
+            return function(**params)
+
+        import cProfile
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(function, **params)
+        finally:
+            _dump_stats(profile, name)
+
+def _dump_stats(profile, name):
+    import pstats
+
+    try:
+        stream = StringIO()
+        stats = pstats.Stats(profile, stream=stream)
+        stats.sort_stats('cumulative').print_stats(50)
+
+        with codecs.open(PROFILER_STATS_FILE, 'w', encoding='utf8') as f:
+            f.write(u'Route: {}\n'.format(name))
+            f.write(stream.getvalue())
+    except Exception as e:
+        log.debug('Profiler: Failed to write stats')
+        log.exception(e)
+
+def stop():
+    global _trace
+
+    if _trace is None:
+        return
+
+    trace, _trace = _trace, None
+
+    data = {
+        'route': trace['route'] or trace['url'],
+        'time': trace['time'],
+        'total': int((time.time() - trace['start']) * 1000),
+        'events': trace['events'],
+    }
+
+    try:
+        _write(data)
+    except Exception as e:
+        log.debug('Profiler: Failed to write trace')
+        log.exception(e)
+
+    log.debug('Profiler: %s took %sms', data['route'], data['total'])
+
+def _write(data):
+    lines = _read_lines()[-(PROFILER_MAX_TRACES-1):]
+    lines.append(json.dumps(data, separators=(',', ':')))
+
+    with io.open(PROFILER_FILE, 'w', encoding='utf8') as f:
+        f.write(u'\n'.join(lines) + u'\n')
+
+def _read_lines():
+    try:
+        with io.open(PROFILER_FILE, 'r', encoding='utf8') as f:
+            return [line.strip() for line in f if line.strip()]
+    except IOError:
+        return []
+
+def traces():
+    rows = []
+    for line in _read_lines():
+        try:
+            rows.append(json.loads(line))
+        except ValueError:
+            pass
+
+    return rows
+
+def summary(limit=20):
+    routes = {}
+    for trace in traces():
+        row = routes.setdefault(trace['route'], {'count': 0, 'total': 0, 'max': 0, 'events': {}})
+        row['count'] += 1
+        row['total'] += trace['total']
+        row['max'] = max(row['max'], trace['total'])
+
+        for _type, name, ms in trace['events']:
+            key = u'{}: {}'.format(_type, name) if _type in (TYPE_SIGNAL, TYPE_ROUTE) else _type
+            row['events'][key] = row['events'].get(key, 0) + ms
+
+    lines = []
+    for route in sorted(routes, key=lambda x: routes[x]['max'], reverse=True)[:limit]:
+        row = routes[route]
+        lines.append(u'[B]{}[/B]  x{}  avg {}ms  max {}ms'.format(route, row['count'], int(row['total'] / row['count']), row['max']))
+
+        slowest = sorted(row['events'].items(), key=lambda x: x[1], reverse=True)[:5]
+        for key, ms in slowest:
+            lines.append(u'    {}  avg {}ms'.format(key, int(ms / row['count'])))
+
+    return u'\n'.join(lines)
@@ -0,0 +1,134 @@
+import os
+import time
+import codecs
+import threading
+
+from six.moves.urllib_parse import parse_qsl, urlparse
+from kodi_six import xbmc
+
+from .constants import ROUTE_TAG, PROXY_HOOKS_CHECK
+from .util import get_addon
+from .log import log
+
+HOOKS_FILE = os.path.join('resources', 'lib', 'proxy_hooks.py')
+
+TYPE_MIDDLEWARE = 'middleware'
+TYPE_RESOLVER   = 'resolver'
+
+_hooks   = {}
+_loaded  = {}
+_checked = {}
+_lock    = threading.Lock()
+_loading = None
+
+class Response(object):
+    ## Returned by a resolver to answer the request directly instead of with a url to proxy to
+    def __init__(self, content, headers=None, status_code=200):
+        self.content     = content
+        self.headers     = headers or {}
+        self.status_code = status_code
+
+## Hooks run inside the proxy service instead of a new plugin invocation.
+## An addon opts in by shipping resources/lib/proxy_hooks.py, eg.
+##
+##   from slyguy import proxy_hooks
+##
+##   @proxy_hooks.middleware('mpd_request')
+##   def mpd_request(data, headers, **kwargs):
+##       return data
+##
+## The route name matches the addon's plugin route, so the same plugin url works with
+## older proxies (through xbmcvfs.listdir). Middleware returns the new manifest text,
+## resolvers return a url (optionally as (url, headers)) or a Response.
+## Hooks run in the service process so they only get the url args, request headers and data.
+## They can't use the addon's own settings / userdata (pass what is needed as url args instead).
+## Licence requests that need the addon's login (eg. binge, bein connect refresh their tokens first)
+## stay on the plugin route until hooks can read and write the addon's userdata.
+## Importing the file from the addon itself is fine, the decorators only register while loading.
+## The file is checked every PROXY_HOOKS_CHECK seconds and reloaded when the addon version or file changes.
+
+# @proxy_hooks.middleware('mpd_request')
+def middleware(route):
+    return _register(TYPE_MIDDLEWARE, route)
+
+# @proxy_hooks.resolver('license_request')
+def resolver(route):
+    return _register(TYPE_RESOLVER, route)
+
+def _register(_type, route):
+    def decorator(f):
+        if _loading:
+            _hooks[(_loading, _type, route)] = f
+        return f
+    return decorator
+
+def _unload(addon_id):
+    for key in [key for key in _hooks if key[0] == addon_id]:
+        del _hooks[key]
+
+def _load(addon_id):
+    global _loading
+
+    with _lock:
+        now = time.time()
+        if now - _checked.get(addon_id, 0) < PROXY_HOOKS_CHECK:
+            return
+
+        _checked[addon_id] = now
+
+        addon = get_addon(addon_id, install=False)
+        if not addon:
+            _unload(addon_id)
+            _loaded.pop(addon_id, None)
+            return
+
+        file_path = os.path.join(xbmc.translatePath(addon.getAddonInfo('path')), HOOKS_FILE)
+
+        try:
+            mtime = os.path.getmtime(file_path)
+        except OSError:
+            mtime = None
+
+        version = (addon.getAddonInfo('version'), mtime)
+        if _loaded.get(addon_id) == version:
+            return
+
+        _unload(addon_id)
+        if mtime is None:
+            _loaded[addon_id] = version
+            return
+
+        _loading = addon_id
+        try:
+            with codecs.open(file_path, 'r', encoding='utf8') as f:
+                code = compile(f.read(), file_path, 'exec')
+
+            exec(code, {'__name__': 'proxy_hooks_{}'.format(addon_id.replace('.', '_')), '__file__': file_path})
+        except Exception as e:
+            _unload(addon_id)
+            log.debug('Failed to load proxy hooks: %s', file_path)
+            log.exception(e)
+        else:
+            _loaded[addon_id] = version
+            log.debug('Proxy hooks loaded: %s (%s)', addon_id, version[0])
+        finally:
+            _loading = None
+
+def get_hook(_type, url):
+    """Returns (function, kwargs) for a plugin url or (None, None) if the addon has not registered one"""
+    parsed = urlparse(url)
+    if parsed.scheme.lower() != 'plugin':
+        return None, None
+
+    params = dict(parse_qsl(parsed.query, keep_blank_values=True))
+    route  = params.pop(ROUTE_TAG, None)
+    if not route:
+        return None, None
+
+    _load(parsed.netloc)
+
+    func = _hooks.get((parsed.netloc, _type, route))
+    if not func:
+        return None, None
+
+    return func, params
@@ -1,19 +1,23 @@
 import sys
 from six.moves.urllib_parse import parse_qsl, urlparse, urlencode
 
-from . import signals
+from . import signals, profiler
 from .constants import *
 from .log import log
 from .language import _
 from .exceptions import RouterError, Exit
 
 _routes = {}
+_names  = {}
+_bases  = {}
 
 # @router.add('_settings', settings)
 def add(url, f):
     if url == None:
         url = f.__name__
     _routes[url] = f
+    # first registered route wins, same as scanning _routes
+    _names.setdefault(f.__name__, url)
 
 # @router.route('_settings')
 def route(url):
@@ -63,13 +67,18 @@ def parse_url(url):
     if not function:
         raise RouterError(_(_.ROUTER_NO_FUNCTION, raw_url=url, parsed_url=_url))
 
-    log('Router Parsed: \'{0}\' => {1} {2}'.format(url, function.__name__, params))
+    log('Router Parsed: \'%s\' => %s %s', url, function.__name__, params)
 
     return function, params
 
 def url_for_func(func, **kwargs):
+    _url = _names.get(func.__name__)
+    if _url is not None and _url in _routes and _routes[_url].__name__ == func.__name__:
+        return build_url(_url, **kwargs)
+
     for _url in _routes:
         if _routes[_url].__name__ == func.__name__:
+            _names[func.__name__] = _url
             return build_url(_url, **kwargs)
 
     raise RouterError(_(_.ROUTER_NO_URL, function_name=func.__name__))
@@ -80,10 +89,7 @@ def url_for(func_or_url, **kwargs):
     else:
         return build_url(func_or_url, **kwargs)
 
-def build_url(_url, _addon_id=ADDON_ID, **kwargs):
-    kwargs[ROUTE_TAG] = _url
-    is_live = kwargs.pop('_is_live', kwargs.pop('_noresume', False))
-
+def _encode_params(kwargs):
     params = []
     for k in sorted(kwargs):
         if kwargs[k] == None:
@@ -92,13 +98,38 @@ def build_url(_url, _addon_id=ADDON_ID, **kwargs):
         try: params.append((k, unicode(kwargs[k]).encode('utf-8')))
         except: params.append((k, kwargs[k]))
 
+    return params
+
+def build_url(_url, _addon_id=ADDON_ID, **kwargs):
+    is_live = kwargs.pop('_is_live', kwargs.pop('_noresume', False))
+
+    ## Fast path. The encoded addon + route base is cached and only the item args are encoded.
+    ## Only valid when the route tag sorts first, otherwise fallback to build the full url
+    if _url != None and ROUTE_TAG not in kwargs and all(k > ROUTE_TAG for k in kwargs):
+        key = (_addon_id, _url)
+        base = _bases.get(key)
+        if base is None:
+            base = _bases[key] = 'plugin://{0}/?{1}'.format(_addon_id, urlencode(_encode_params({ROUTE_TAG: _url})))
+
+        params = _encode_params(kwargs)
+        if is_live:
+            params.append((ROUTE_LIVE_TAG, ROUTE_LIVE_SUFFIX))
+
+        if not params:
+            return base
+
+        return '{0}&{1}'.format(base, urlencode(params))
+
+    kwargs[ROUTE_TAG] = _url
+    params = _encode_params(kwargs)
+
     if is_live:
         params.append((ROUTE_LIVE_TAG, ROUTE_LIVE_SUFFIX))
 
     return 'plugin://{0}/?{1}'.format(_addon_id, urlencode(params))
 
 def redirect(url):
-    log.debug('Redirect -> {}'.format(url))
+    log.debug('Redirect -> %s', url)
 
     if not url.startswith('?') and '?' in url:
         url = '?' + url.split('?')[1]
@@ -110,12 +141,14 @@ def redirect(url):
 
 # router.dispatch('?_=_settings')
 def dispatch(url):
+    profiler.start(url)
+
     with signals.throwable():
         signals.emit(signals.BEFORE_DISPATCH)
         function, params = parse_url(url)
         
         try:
-            function(**params)
+            profiler.run_route(function.__name__, function, **params)
         except TypeError as e:
             try: error = str(e)
             except: error = ''
@@ -125,4 +158,5 @@ def dispatch(url):
             else:
                 raise
 
-    signals.emit(signals.AFTER_DISPATCH)
\ No newline at end of file
+    signals.emit(signals.AFTER_DISPATCH)
+    profiler.stop()
\ No newline at end of file
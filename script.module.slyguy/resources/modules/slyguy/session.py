@@ -1,11 +1,15 @@
 import json
 import socket
+from time import time
 from gzip import GzipFile
 
 import requests
+from requests.adapters import HTTPAdapter, DEFAULT_POOLSIZE
+from urllib3.poolmanager import PoolManager
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 from six import BytesIO
 
-from . import userdata, settings
+from . import userdata, settings, profiler
 from .log import log
 from .language import _
 from .exceptions import SessionError
@@ -32,9 +36,67 @@ def getaddrinfoPreferIPv4(host, port, family=0, _type=0, proto=0, flags=0):
 
 socket.getaddrinfo = getaddrinfoPreferIPv4
 
-class RawSession(requests.Session):
+class IdlePoolMixin(object):
+    idle_timeout = None
+
+    def _get_conn(self, timeout=None):
+        # urllib3 already drops connections the server closed. Also drop ones idle too long (CDNs silently time them out)
+        conn = super(IdlePoolMixin, self)._get_conn(timeout=timeout)
+
+        idle_since = getattr(conn, '_idle_since', None)
+        if self.idle_timeout and idle_since and conn.sock and time() - idle_since > self.idle_timeout:
+            log.debug('Closing idle connection to %s', self.host)
+            conn.close()
+
+        return conn
+
+    def _put_conn(self, conn):
+        if conn:
+            conn._idle_since = time()
+
+        super(IdlePoolMixin, self)._put_conn(conn)
+
+class IdleHTTPConnectionPool(IdlePoolMixin, HTTPConnectionPool):
+    pass
+
+class IdleHTTPSConnectionPool(IdlePoolMixin, HTTPSConnectionPool):
     pass
 
+class IdlePoolManager(PoolManager):
+    def __init__(self, idle_timeout=None, *args, **kwargs):
+        super(IdlePoolManager, self).__init__(*args, **kwargs)
+        self.idle_timeout = idle_timeout
+        self.pool_classes_by_scheme = {
+            'http': IdleHTTPConnectionPool,
+            'https': IdleHTTPSConnectionPool,
+        }
+
+    def _new_pool(self, *args, **kwargs):
+        pool = super(IdlePoolManager, self)._new_pool(*args, **kwargs)
+        pool.idle_timeout = self.idle_timeout
+        return pool
+
+class PoolAdapter(HTTPAdapter):
+    def __init__(self, idle_timeout=None, **kwargs):
+        self._idle_timeout = idle_timeout
+        super(PoolAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+
+        self.poolmanager = IdlePoolManager(idle_timeout=self._idle_timeout, num_pools=connections, maxsize=maxsize, block=block, **pool_kwargs)
+
+class RawSession(requests.Session):
+    def __init__(self, pool_size=None, idle_timeout=None):
+        super(RawSession, self).__init__()
+
+        if pool_size or idle_timeout:
+            adapter = PoolAdapter(idle_timeout=idle_timeout, pool_maxsize=pool_size or DEFAULT_POOLSIZE)
+            self.mount('https://', adapter)
+            self.mount('http://', adapter)
+
 class Session(RawSession):
     def __init__(self, headers=None, cookies_key=None, base_url='{}', timeout=None, attempts=None, verify=None):
         super(Session, self).__init__()
@@ -82,7 +144,8 @@ class Session(RawSession):
                 log('{}{} {}'.format(attempt, method, url))
 
             try:
-                resp = super(Session, self).request(method, url, **kwargs)
+                with profiler.timer(profiler.TYPE_HTTP, method + ' ' + url):
+                    resp = super(Session, self).request(method, url, **kwargs)
             except:
                 resp = None
                 if i == attempts:
@@ -118,4 +181,6 @@ class Session(RawSession):
 
         with open(dst_path, 'wb') as f:
             for chunk in resp.iter_content(CHUNK_SIZE):
-                f.write(chunk)
\ No newline at end of file
+                f.write(chunk)
+
+        return resp
\ No newline at end of file
@@ -3,17 +3,36 @@ import json
 from kodi_six import xbmcaddon
 
 from .constants import ADDON, COMMON_ADDON
+from .log import log
 from . import signals
 
+## During a dispatch each setting is only read from Kodi once.
+## Values are kept until set / open or the dispatch closes.
+_snapshot = None
+_saved    = 0
+
 @signals.on(signals.BEFORE_DISPATCH)
 def before_dispatch():
     #refresh settings
-    global ADDON
+    global ADDON, _snapshot, _saved
     ADDON = xbmcaddon.Addon(ADDON.getAddonInfo('id'))
+    _snapshot = {}
+    _saved = 0
     common_settings.reset()
+    common_settings.snapshot()
+
+@signals.on(signals.ON_CLOSE)
+def on_close():
+    global _snapshot
+    _snapshot = None
+    saved = _saved + common_settings.release()
+    if saved:
+        log.debug('Settings: %s Kodi calls saved', saved)
 
 def open():
     ADDON.openSettings()
+    if _snapshot is not None:
+        _snapshot.clear()
 
 def getDict(key, default=None):
     try:
@@ -63,9 +82,22 @@ def setBool(key, value=True):
     set(key, 'true' if value else 'false')
 
 def get(key, default=''):
-    return ADDON.getSetting(key) or default
+    global _saved
+
+    if _snapshot is None:
+        return ADDON.getSetting(key) or default
+
+    if key in _snapshot:
+        _saved += 1
+    else:
+        _snapshot[key] = ADDON.getSetting(key)
+
+    return _snapshot[key] or default
 
 def set(key, value=''):
+    if _snapshot is not None:
+        _snapshot.pop(key, None)
+
     ADDON.setSetting(key, str(value))
 
 def is_fresh():
@@ -84,7 +116,19 @@ class Settings(object):
         return self._fresh
 
     def __init__(self, _addon=None):
-        self._addon = _addon or ADDON
+        self._addon    = _addon or ADDON
+        self._snapshot = None
+        self._saved    = 0
+
+    def snapshot(self):
+        self._snapshot = {}
+        self._saved = 0
+
+    def release(self):
+        saved = self._saved
+        self._snapshot = None
+        self._saved = 0
+        return saved
 
     def is_fresh(self):
         fresh = self.getBool('_fresh', True)
@@ -96,6 +140,8 @@ class Settings(object):
 
     def open(self):
         self._addon.openSettings()
+        if self._snapshot is not None:
+            self._snapshot.clear()
 
     def getDict(self, key, default=None):
         try:
@@ -148,9 +194,20 @@ class Settings(object):
         self.set(key, 'true' if value else 'false')
 
     def get(self, key, default=''):
-        return self._addon.getSetting(key) or default
+        if self._snapshot is None:
+            return self._addon.getSetting(key) or default
+
+        if key in self._snapshot:
+            self._saved += 1
+        else:
+            self._snapshot[key] = self._addon.getSetting(key)
+
+        return self._snapshot[key] or default
 
     def set(self, key, value=''):
+        if self._snapshot is not None:
+            self._snapshot.pop(key, None)
+
         self._addon.setSetting(key, str(value))
 
 common_settings = Settings(COMMON_ADDON)
\ No newline at end of file
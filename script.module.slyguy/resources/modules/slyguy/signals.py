@@ -1,6 +1,7 @@
 from contextlib import contextmanager
 from collections import defaultdict
 
+from . import profiler
 from .log import log
 from .exceptions import Error, Exit
 
@@ -21,9 +22,14 @@ def on(signal):
     return decorator
 
 def emit(signal, *args, **kwargs):
-    log.debug("SIGNAL: {}".format(signal))
+    log.debug("SIGNAL: %s", signal)
     for f in _signals.get(signal, []):
-        f(*args, **kwargs)
+        if not profiler.active():
+            f(*args, **kwargs)
+            continue
+
+        with profiler.timer(profiler.TYPE_SIGNAL, '{}:{}'.format(signal, f.__name__)):
+            f(*args, **kwargs)
 
 @contextmanager
 def throwable():
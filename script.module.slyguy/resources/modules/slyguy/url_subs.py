@@ -0,0 +1,138 @@
+import os
+import re
+import time
+import threading
+
+from .constants import URL_SUBS_FILE, URL_SUBS_CHECK
+from .log import log
+
+## url_subs.txt is pairs of lines, a regex pattern and its replacement, eg.
+##
+##   ^https://cdn1.example.com/
+##   https://cdn2.example.com/
+##
+## The first rule that changes the url wins.
+## Patterns with no regex syntax (other than a leading ^, . and escaped characters) and replacements
+## without group references are matched as plain strings so host swaps cost a startswith per url.
+## A . in those patterns is taken as a literal dot (as it almost always is in a host / path).
+
+LITERAL_RE = re.compile(r'^\^?(?:[^\\^$*+?{}\[\]|()]|\\[^A-Za-z0-9])*$')
+
+class Rule(object):
+    def __init__(self, pattern, replace):
+        self.pattern = pattern
+        self.replace = replace
+        self._prefix  = None
+        self._literal = None
+        self._regex   = None
+
+        if LITERAL_RE.match(pattern) and '\\' not in replace:
+            literal = re.sub(r'\\(.)', r'\1', pattern.lstrip('^'))
+            if pattern.startswith('^'):
+                self._prefix = literal
+            else:
+                self._literal = literal
+        else:
+            self._regex = re.compile(pattern)
+
+    def sub(self, url):
+        if self._prefix is not None:
+            if url.startswith(self._prefix):
+                return self.replace + url[len(self._prefix):]
+            return url
+
+        if self._literal is not None:
+            return url.replace(self._literal, self.replace) if self._literal else url
+
+        return self._regex.sub(self.replace, url)
+
+class UrlSubs(object):
+    def __init__(self, file_path):
+        self._file_path  = file_path
+        self._rules      = []
+        self._mtime      = None
+        self._last_check = 0
+        self._lock       = threading.Lock()
+
+    def _check(self):
+        now = time.time()
+        if now - self._last_check < URL_SUBS_CHECK:
+            return
+
+        with self._lock:
+            self._last_check = now
+
+            try:
+                mtime = os.path.getmtime(self._file_path)
+            except OSError:
+                mtime = None
+
+            if mtime == self._mtime:
+                return
+
+            self._mtime = mtime
+            self._rules = self._load() if mtime is not None else []
+
+    def _load(self):
+        rules = []
+
+        try:
+            with open(self._file_path, 'r') as f:
+                lines = [line.rstrip('\r\n') for line in f]
+        except Exception as e:
+            log.debug('failed to read %s', self._file_path)
+            log.exception(e)
+            return rules
+
+        i = 0
+        while i < len(lines):
+            pattern = lines[i].rstrip()
+            i += 1
+            if not pattern: # blank line
+                continue
+
+            replace = lines[i].rstrip() if i < len(lines) else ''
+            i += 1
+            if not replace: # no replace after pattern
+                continue
+
+            try:
+                rules.append(Rule(pattern, replace))
+            except Exception as e:
+                log.debug('invalid url sub pattern: %s', pattern)
+                log.exception(e)
+
+        log.debug('Loaded %s url subs from %s', len(rules), self._file_path)
+        return rules
+
+    def sub(self, url):
+        self._check()
+
+        for rule in self._rules:
+            try:
+                _url = rule.sub(url)
+            except Exception as e:
+                log.debug('url sub failed: %s', rule.pattern)
+                log.exception(e)
+                continue
+
+            if _url != url:
+                log.debug('URL sub match: %s > %s', url, _url)
+                return _url
+
+        return url
+
+_subs = {}
+_subs_lock = threading.Lock()
+
+def get_subs(file_path=None):
+    file_path = file_path or URL_SUBS_FILE
+
+    with _subs_lock:
+        if file_path not in _subs:
+            _subs[file_path] = UrlSubs(file_path)
+
+        return _subs[file_path]
+
+def sub(url, file_path=None):
+    return get_subs(file_path).sub(url)
@@ -1,34 +1,123 @@
-from . import settings
+import threading
+from copy import deepcopy
+from contextlib import contextmanager
+
+from . import settings, signals
 from .constants import ADDON, USERDATA_KEY
 
+## Userdata is kept in memory for the length of a dispatch (or batch) and written
+## back to the settings once at the end, instead of a full json parse + setSetting per change.
+## Outside of a dispatch / batch (eg. services) every get re-reads the settings and every
+## change is written straight away, so a long running process never writes back a stale copy.
+
+_lock        = threading.RLock()
+_data        = None
+_dirty       = False
+_dispatching = False
+_batch       = 0
+
+@signals.on(signals.BEFORE_DISPATCH)
+def _before_dispatch():
+    global _data, _dispatching
+
+    with _lock:
+        flush()
+        # another process may have changed it since the last dispatch
+        _data = None
+        _dispatching = True
+
+@signals.on(signals.ON_CLOSE)
+def _on_close():
+    global _dispatching
+
+    with _lock:
+        _dispatching = False
+        flush()
+        _release()
+
+def flush():
+    global _dirty
+
+    with _lock:
+        if not _dirty:
+            return
+
+        settings.setDict(USERDATA_KEY, _data)
+        _dirty = False
+
+@contextmanager
+def batch():
+    global _batch
+
+    with _lock:
+        _batch += 1
+
+    try:
+        yield
+    finally:
+        with _lock:
+            _batch -= 1
+            if not _batch and not _dispatching:
+                flush()
+                _release()
+
+def _caching():
+    return _dispatching or _batch > 0
+
+def _release():
+    global _data
+
+    if not _dirty and not _caching():
+        _data = None
+
+def _copy(value):
+    return deepcopy(value) if isinstance(value, (dict, list)) else value
+
 def _get_data():
-    return settings.getDict(USERDATA_KEY, {})
+    global _data
 
-def get(key, default=None):
-    return _get_data().get(key, default)
+    if _data is None or not _caching():
+        _data = settings.getDict(USERDATA_KEY, {})
 
-def set(key, value):
-    data = _get_data()
-    data[key] = value
-    _set_data(data)
+    return _data
 
 def _set_data(data):
-    settings.setDict(USERDATA_KEY, data)
+    global _data, _dirty
+
+    _data = data
+    _dirty = True
+
+    if not _caching():
+        flush()
+        _release()
+
+def get(key, default=None):
+    with _lock:
+        return _copy(_get_data().get(key, default))
+
+def set(key, value):
+    with _lock:
+        data = _get_data()
+        data[key] = _copy(value)
+        _set_data(data)
 
 def pop(key, default=None):
-    data = _get_data()
-    value = data.pop(key, default)
-    _set_data(data)
-    return value
+    with _lock:
+        data = _get_data()
+        value = data.pop(key, default)
+        _set_data(data)
+        return value
 
 def delete(key):
-    data = _get_data()
-    if key in data:
-        del data[key]
-        _set_data(data)
-    
+    with _lock:
+        data = _get_data()
+        if key in data:
+            del data[key]
+            _set_data(data)
+
 def clear():
-    _set_data({})
+    with _lock:
+        _set_data({})
 
 class Userdata(object):
     def __init__(self, _addon=None):
@@ -59,6 +148,6 @@ class Userdata(object):
         if key in data:
             del data[key]
             self._set_data(data)
-        
+
     def clear(self):
-        self._set_data({})
\ No newline at end of file
+        self._set_data({})
@@ -15,52 +15,23 @@ import socket
 from contextlib import closing
 
 from kodi_six import xbmc, xbmcgui, xbmcaddon
-from six.moves import queue
 from six.moves.urllib.parse import urlparse, urlunparse
 from six import PY2
 import requests
 
+from . import concurrency, url_subs
 from .language import _
 from .log import log
 from .exceptions import Error
-from .constants import WIDEVINE_UUID, WIDEVINE_PSSH, DEFAULT_WORKERS, ADDON_PROFILE, CHUNK_SIZE
+from .constants import WIDEVINE_UUID, WIDEVINE_PSSH, DEFAULT_WORKERS, ADDON_PROFILE, CHUNK_SIZE, MD5_CACHE_FILE, MD5_CACHE_SIZE
 
 def fix_url(url):
     parse = urlparse(url)
     parse = parse._replace(path=re.sub('/{2,}','/',parse.path))
     return urlunparse(parse)
 
-def url_sub(url):
-    file_path = os.path.join(ADDON_PROFILE, 'url_subs.txt')
-    if not os.path.exists(file_path):
-        return url
-
-    try:
-        with open(file_path, 'r') as f:
-            while True:
-                pattern = f.readline()
-                if not pattern: # end of file
-                    break
-
-                pattern = pattern.rstrip()
-                if not pattern: # blank line
-                    continue
-
-                replace = f.readline().rstrip()
-                if not replace: # no replace after pattern
-                    continue
-
-                _url = re.sub(pattern, replace, url)
-                if _url != url:
-                    log.debug('URL sub match: {} > {}'.format(url, _url))
-                    url = _url
-                    break
-
-    except Exception as e:
-        log.debug('failed to parse urls.txt')
-        log.exception(e)
-
-    return url
+def url_sub(url, file_path=None):
+    return url_subs.sub(url, file_path)
 
 def check_port(port=0, default=False):
     try:
@@ -90,52 +61,43 @@ def kodi_db(name):
         return None
 
 def async_tasks(tasks, workers=DEFAULT_WORKERS, raise_on_error=True):
-    def worker():
-        while not task_queue.empty():
-            task, index = task_queue.get_nowait()
-            try:
-                resp_queue.put([task(), index])
-            except Exception as e:
-                resp_queue.put([e, index])
-            finally:
-                task_queue.task_done()
-
-    task_queue = queue.Queue()
-    resp_queue = queue.Queue()
-
-    for i in range(len(tasks)):
-        task_queue.put([tasks[i], i])
-
-    threads = []
-    num_workers = min(workers, len(tasks))
-    log.debug('Starting {} workers'.format(num_workers))
-    for i in range(num_workers):
-        thread = threading.Thread(target=worker)
-        thread.daemon = True
-        thread.start()
-        threads.append(thread)
-
-    results = []
-    exception = None
-    for i in range(len(tasks)):
-        result = resp_queue.get()
-
-        if raise_on_error and isinstance(result[0], Exception):
-            with task_queue.mutex:
-                task_queue.queue.clear()
-
-            exception = result[0]
-            break
-
-        results.append(result)
-
-    for thread in threads:
-        thread.join()
-
-    if exception:
-        raise exception
-
-    return [x[0] for x in sorted(results, key=lambda x: x[1])]
+    def run(task):
+        try:
+            return task()
+        except Exception as e:
+            if raise_on_error:
+                raise
+            return e
+
+    return concurrency.map(run, tasks, workers=workers)
+
+def paginate(fetch_page, page_size, first_page=1, workers=DEFAULT_WORKERS):
+    """Yields the items of every page in order.
+
+    fetch_page(page) returns (items, total) where total is the total number of items.
+    Once the first page gives the total, the remaining pages are fetched on the worker pool
+    (workers at a time). If total is None, pages are walked one by one until a short page.
+    """
+    items, total = fetch_page(first_page)
+    for item in items:
+        yield item
+
+    if total is None:
+        page = first_page
+        while len(items) >= page_size:
+            page += 1
+            items, total = fetch_page(page)
+            for item in items:
+                yield item
+        return
+
+    num_pages = -(-int(total) // page_size)
+    pages = list(range(first_page+1, first_page+num_pages))
+    log.debug('Paginate: %s items over %s pages', total, num_pages)
+
+    for items in concurrency.imap(lambda page: fetch_page(page)[0], pages, workers=workers):
+        for item in items:
+            yield item
 
 def get_addon(addon_id, required=False, install=True):
     try:
@@ -315,11 +277,61 @@ def hash_6(value, default=None, length=6):
     h = hashlib.md5(u'{}'.format(value).encode('utf8'))
     return base64.b64encode(h.digest()).decode('utf8')[:length]
 
+_md5_cache = None
+_md5_lock  = threading.Lock()
+
+def _get_md5_cache():
+    global _md5_cache
+
+    if _md5_cache is None:
+        try:
+            with open(MD5_CACHE_FILE, 'r') as f:
+                _md5_cache = json.load(f)
+        except:
+            _md5_cache = {}
+
+    return _md5_cache
+
 def md5sum(filepath):
-    if not os.path.exists(filepath):
+    try:
+        stat = os.stat(filepath)
+    except OSError:
         return None
 
-    return hashlib.md5(open(filepath,'rb').read()).hexdigest()
+    ## Checksums are cached on (path, size, mtime) so re-checking an unchanged file is just a stat
+    key = [stat.st_size, stat.st_mtime]
+    with _md5_lock:
+        row = _get_md5_cache().get(filepath)
+        if row and row[:2] == key:
+            return row[2]
+
+    h = hashlib.md5()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+
+    checksum = h.hexdigest()
+
+    # file may still be being written to within the same mtime
+    if time.time() - stat.st_mtime < 2:
+        return checksum
+
+    with _md5_lock:
+        cache = _get_md5_cache()
+        cache.pop(filepath, None)
+        cache[filepath] = key + [checksum]
+
+        for path in list(cache.keys())[:-MD5_CACHE_SIZE]:
+            cache.pop(path)
+
+        try:
+            with open(MD5_CACHE_FILE, 'w') as f:
+                json.dump(cache, f)
+        except Exception as e:
+            log.debug('Failed to save md5 cache')
+            log.exception(e)
+
+    return checksum
 
 ## to find BCOV-POLICY. Open below url
 ## account_id / player_id / videoid can be found by right clicking player and selecting Player Information
@@ -1,18 +1,17 @@
 import random
 import re
 from time import time
-from xml.dom.minidom import parseString
 
 from kodi_six import xbmc, xbmcplugin
 from slyguy import plugin, gui, userdata, signals, inputstream, settings
 from slyguy.log import log
-from slyguy.util import cenc_init
 from slyguy.constants import ROUTE_RESUME_TAG
 from slyguy.exceptions import Exit
 
 from .api import API
 from .constants import *
 from .language import _
+from .proxy_hooks import fix_mpd
 
 api = API()
 
@@ -423,64 +422,15 @@ def _get_play_path(slug):
 @plugin.route()
 @plugin.plugin_callback()
 def mpd_request(_data, _data_path, **kwargs):
-    data = _data.decode('utf8')
-
-    data = data.replace('_xmlns:cenc', 'xmlns:cenc')
-    data = data.replace('_:default_KID', 'cenc:default_KID')
-    data = data.replace('<pssh', '<cenc:pssh')
-    data = data.replace('</pssh>', '</cenc:pssh>')
-
-    root = parseString(data.encode('utf8'))
-
-    wv_secure = settings.getBool('wv_secure')
-    if not wv_secure:
-        for adap_set in root.getElementsByTagName('AdaptationSet'):
-            height = int(adap_set.getAttribute('maxHeight') or 0)
-            width = int(adap_set.getAttribute('maxWidth') or 0)
-
-            if width < 1280 or height < 720:
-                #keep
-                pass
-            else:
-                parent = adap_set.parentNode
-                parent.removeChild(adap_set)
-
-    dolby_vison = settings.getBool('dolby_vision', False)
-    h265        = settings.getBool('h265', True)
-    enable_4k   = settings.getBool('4k_enabled', True)
-
-    for elem in root.getElementsByTagName('Representation'):
-        parent = elem.parentNode
-        codecs = elem.getAttribute('codecs')
-        height = int(elem.getAttribute('height') or 0)
-        width = int(elem.getAttribute('width') or 0)
-
-        if not dolby_vison and codecs.startswith('dvh1'):
-            parent.removeChild(elem)
-
-        elif not h265 and (codecs.startswith('hvc') or codecs.startswith('hev')):
-            parent.removeChild(elem)
-
-        elif not enable_4k and (height > 1080 or width > 1920):
-            parent.removeChild(elem)
-
-    for adap_set in root.getElementsByTagName('AdaptationSet'):
-        if not adap_set.getElementsByTagName('Representation'):
-            adap_set.parentNode.removeChild(adap_set)
-
-    ## do below to convert all to cenc0 to work on firestick
-    cenc_data = ''
-    for elem in root.getElementsByTagName('ContentProtection'):
-        default_kid = elem.getAttribute('cenc:default_KID').replace('-','').replace(' ','')
-        if default_kid and default_kid not in cenc_data:
-            cenc_data += '1210' + default_kid
-
-    new_cenc = cenc_init(bytearray.fromhex(cenc_data))
-    for elem in root.getElementsByTagName('cenc:pssh'):
-        elem.firstChild.nodeValue = new_cenc
+    data = fix_mpd(_data.decode('utf8'),
+        wv_secure = settings.getBool('wv_secure'),
+        dolby_vision = settings.getBool('dolby_vision', False),
+        h265 = settings.getBool('h265', True),
+        enable_4k = settings.getBool('4k_enabled', True),
+    )
 
     with open(_data_path, 'wb') as f:
-        f.write(root.toprettyxml(encoding='utf-8'))
+        f.write(data.encode('utf8'))
 
     return _data_path
 
@@ -510,7 +460,12 @@ def play(slug, skip_intro=None, **kwargs):
 
     if 'drm' in data:
         item.inputstream = inputstream.Widevine(license_key = data['drm']['licenseUrl'])
-        item.proxy_data['manifest_middleware'] = plugin.url_for(mpd_request)
+        item.proxy_data['manifest_middleware'] = plugin.url_for(mpd_request,
+            wv_secure = int(settings.getBool('wv_secure')),
+            dolby_vision = int(settings.getBool('dolby_vision', False)),
+            h265 = int(settings.getBool('h265', True)),
+            enable_4k = int(settings.getBool('4k_enabled', True)),
+        )
         if settings.getBool('wv_secure'):
             item.inputstream.properties['license_flags'] = 'force_secure_decoder'
 
@@ -0,0 +1,62 @@
+from xml.dom.minidom import parseString
+
+from slyguy import proxy_hooks
+from slyguy.util import cenc_init
+
+## Loaded by the proxy service. Only import from slyguy or the standard library here
+
+@proxy_hooks.middleware('mpd_request')
+def mpd_request(data, headers, wv_secure=0, dolby_vision=0, h265=1, enable_4k=1, **kwargs):
+    return fix_mpd(data, int(wv_secure), int(dolby_vision), int(h265), int(enable_4k))
+
+def fix_mpd(data, wv_secure=False, dolby_vision=False, h265=True, enable_4k=True):
+    data = data.replace('_xmlns:cenc', 'xmlns:cenc')
+    data = data.replace('_:default_KID', 'cenc:default_KID')
+    data = data.replace('<pssh', '<cenc:pssh')
+    data = data.replace('</pssh>', '</cenc:pssh>')
+
+    root = parseString(data.encode('utf8'))
+
+    if not wv_secure:
+        for adap_set in root.getElementsByTagName('AdaptationSet'):
+            height = int(adap_set.getAttribute('maxHeight') or 0)
+            width = int(adap_set.getAttribute('maxWidth') or 0)
+
+            if width < 1280 or height < 720:
+                #keep
+                pass
+            else:
+                parent = adap_set.parentNode
+                parent.removeChild(adap_set)
+
+    for elem in root.getElementsByTagName('Representation'):
+        parent = elem.parentNode
+        codecs = elem.getAttribute('codecs')
+        height = int(elem.getAttribute('height') or 0)
+        width = int(elem.getAttribute('width') or 0)
+
+        if not dolby_vision and codecs.startswith('dvh1'):
+            parent.removeChild(elem)
+
+        elif not h265 and (codecs.startswith('hvc') or codecs.startswith('hev')):
+            parent.removeChild(elem)
+
+        elif not enable_4k and (height > 1080 or width > 1920):
+            parent.removeChild(elem)
+
+    for adap_set in root.getElementsByTagName('AdaptationSet'):
+        if not adap_set.getElementsByTagName('Representation'):
+            adap_set.parentNode.removeChild(adap_set)
+
+    ## do below to convert all to cenc0 to work on firestick
+    cenc_data = ''
+    for elem in root.getElementsByTagName('ContentProtection'):
+        default_kid = elem.getAttribute('cenc:default_KID').replace('-','').replace(' ','')
+        if default_kid and default_kid not in cenc_data:
+            cenc_data += '1210' + default_kid
+
+    new_cenc = cenc_init(bytearray.fromhex(cenc_data))
+    for elem in root.getElementsByTagName('cenc:pssh'):
+        elem.firstChild.nodeValue = new_cenc
+
+    return root.toprettyxml(encoding='utf-8').decode('utf8')
@@ -1,12 +1,12 @@
 import time
 import hashlib
 
-from slyguy import userdata, util
+from slyguy import userdata, util, graphql
 from slyguy.session import Session
 from slyguy.exceptions import Error
 from slyguy.util import jwt_data
 
-from .constants import API_URL, HEADERS, BRIGHTCOVE_URL, BRIGHTCOVE_ACCOUNT, BRIGHTCOVE_KEY
+from .constants import API_URL, HEADERS, BRIGHTCOVE_URL, BRIGHTCOVE_ACCOUNT, BRIGHTCOVE_KEY, CONTENT_EXPIRY
 from . import queries
 
 class APIError(Error):
@@ -38,12 +38,7 @@ class API(object):
         }
 
     def _query_request(self, query, variables=None, **kwargs):
-        data = {
-            'query': ' '.join(query.split()), 
-            'variables': variables or {},
-        }
-
-        return self._session.post(API_URL, json=data, **kwargs).json()
+        return graphql.request(self._session, API_URL, query, variables, **kwargs)
 
     def _set_token(self, jwt_token):
         userdata.set('jwt_token', jwt_token)
@@ -75,7 +70,9 @@ class API(object):
             'screenId': screen_id,
         }
 
-        return self._query_request(queries.CONTENT, variables)['data']['screen']
+        ## playbackInfo / rentalInfo change once something is played, so each playback starts a new cache
+        cache_key = [userdata.get('profile_id'), userdata.get('last_played')]
+        return self._query_request(queries.CONTENT, variables, expires=CONTENT_EXPIRY, cache_key=cache_key)['data']['screen']
 
     def _check_token(self):
         if time.time() < userdata.get('expires', 0):
@@ -133,6 +130,7 @@ class API(object):
             'contentItemId': contentID,
         }
 
+        userdata.set('last_played', int(time.time()))
         return self._query_request(queries.PLAYBACK_AUTH, variables)
 
     def get_brightcove_src(self, referenceID, jwt_token):
@@ -147,4 +145,5 @@ class API(object):
         userdata.delete('profile_name')
         userdata.delete('profile_icon')
         userdata.delete('profile_kids')
+        userdata.delete('last_played')
         self.new_session()
\ No newline at end of file
@@ -4,6 +4,7 @@ HEADERS = {
 }
 
 API_URL            = 'https://api.neontv.co.nz/api/client/gql'
+CONTENT_EXPIRY     = 60*5
 
 BRIGHTCOVE_URL     = 'https://edge.api.brightcove.com/playback/v1/accounts/{}/videos/ref:{}?jwtauth={}'
 BRIGHTCOVE_ACCOUNT = '5449166731001'
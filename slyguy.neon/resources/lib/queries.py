@@ -1,4 +1,6 @@
-LOGIN = """
+from slyguy.graphql import Query
+
+LOGIN = Query("""
 query LoginQuery($input: ConfigInput, $username: String!, $password: String!) {
     config(input: $input) {
         __typename
@@ -11,9 +13,9 @@ query LoginQuery($input: ConfigInput, $username: String!, $password: String!) {
             subscription {__typename status}
     }
 }
-"""
+""")
 
-CONFIG = """
+CONFIG = Query("""
 query SplashConfig($input: ConfigInput) {
     config(input: $input) {
         __typename 
@@ -21,9 +23,9 @@ query SplashConfig($input: ConfigInput) {
             videoPlayer {__typename videoCloudPlayerId videoCloudAccountId videoCloudPolicyKey}
     }
 }
-"""
+""")
 
-ACCOUNT = """
+ACCOUNT = Query("""
 query AccountQuery {
   account {
     ...AccountFields
@@ -413,9 +415,9 @@ fragment SubscriptionInformationFields on SubscriptionInformation {
   }
   __typename
 }
-"""
+""")
 
-CONTENT = """
+CONTENT = Query("""
 query ScreenQuery($screenId: String!, $overrides: JSON) {
   screen(id: $screenId, overrides: $overrides) {
     ...ScreenFields
@@ -1170,9 +1172,9 @@ fragment RatingFields on Rating {
   reason
   __typename
 }
-"""
+""")
 
-UPDATE_ACCOUNT = """
+UPDATE_ACCOUNT = Query("""
 mutation UpdateAccount($input: AccountInput!, $pin: String) {
   account(input: $input, pin: $pin) {
     ...AccountFields
@@ -1562,9 +1564,9 @@ fragment SubscriptionInformationFields on SubscriptionInformation {
   }
   __typename
 }
-"""
+""")
 
-PLAYBACK_AUTH = """
+PLAYBACK_AUTH = Query("""
 query playbackAuth($contentItemId: ID!) {
     playbackAuth(contentItemId: $contentItemId) {
         __typename
@@ -1572,9 +1574,9 @@ query playbackAuth($contentItemId: ID!) {
             firstPlayback {__typename rentalPeriodHours viewingPeriodHours}
     }
 }
-"""
+""")
 
-SEARCH = """
+SEARCH = Query("""
 query search($input: SearchInput) {
   search(input: $input) {
     ...SearchScreenFields
@@ -1841,4 +1843,4 @@ fragment VideoEncodingFields on VideoEncoding {
   offlineEnabled
   __typename
 }
-"""
\ No newline at end of file
+""")
\ No newline at end of file
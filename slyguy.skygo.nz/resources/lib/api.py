@@ -3,7 +3,7 @@ from time import time
 from bs4 import BeautifulSoup
 from six.moves.urllib_parse import urlparse, parse_qsl
 
-from slyguy import userdata
+from slyguy import userdata, graphql
 from slyguy.session import Session
 from slyguy.log import log
 from slyguy.exceptions import Error
@@ -34,12 +34,7 @@ class API(object):
     def _query_request(self, query, variables=None, **kwargs):
         self._refresh_token()
 
-        data = {
-            'query': ' '.join(query.split()),
-            'variables': variables or {},
-        }
-
-        return self._session.post(GRAPH_URL, json=data, **kwargs).json()
+        return graphql.request(self._session, GRAPH_URL, query, variables, **kwargs)
 
     def _refresh_token(self, force=False):
         if not force and userdata.get('expires', 0) > time() or not self.logged_in:
@@ -1,4 +1,6 @@
-CHANNELS = """
+from slyguy.graphql import Query
+
+CHANNELS = Query("""
 query {
   linearChannelGroups {
     id
@@ -14,9 +16,9 @@ query {
     }
   }
 }
-"""
+""")
 
-START_LINEAR = """
+START_LINEAR = Query("""
 mutation startLinearPlayback ($channelId: ID!, $deviceId: ID!) {
     startLinearPlayback(channelId: $channelId, deviceId: $deviceId) {
       __typename
@@ -46,10 +48,10 @@ mutation startLinearPlayback ($channelId: ID!, $deviceId: ID!) {
   }
     }
   }
-"""
+""")
 
-STOP_LINEAR = """
+STOP_LINEAR = Query("""
 mutation StopLinearPlayback($channelId: ID!, $deviceId: ID!) {
     stopLinearPlayback(channelId: $channelId, deviceId: $deviceId)
 }
-"""
+""")
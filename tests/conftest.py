@@ -0,0 +1,61 @@
+import os
+import sys
+import types
+import tempfile
+
+from unittest import mock
+
+## Just enough of the Kodi api to import script.module.slyguy outside of Kodi
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SLYGUY = os.path.join(ROOT, 'script.module.slyguy')
+TEMP = tempfile.mkdtemp(prefix='slyguy_tests_')
+
+KODI_API = {
+    'xbmc': ['LOGDEBUG', 'LOGERROR', 'LOGFATAL', 'LOGINFO', 'LOGNONE', 'LOGWARNING', 'Monitor', 'PLAYLIST_MUSIC',
+        'PLAYLIST_VIDEO', 'PlayList', 'Player', 'executeJSONRPC', 'executebuiltin', 'getCondVisibility', 'getInfoLabel',
+        'getLocalizedString', 'getUserAgent', 'log', 'sleep', 'translatePath'],
+    'xbmcaddon': ['Addon'],
+    'xbmcgui': ['ALPHANUM_HIDE_INPUT', 'Dialog', 'DialogProgress', 'DialogProgressBG', 'ListItem', 'Window'],
+    'xbmcplugin': ['SORT_METHOD_LABEL', 'SORT_METHOD_UNSORTED', 'addDirectoryItem', 'addSortMethod', 'endOfDirectory',
+        'setContent', 'setPluginCategory', 'setResolvedUrl'],
+    'xbmcvfs': ['listdir', 'translatePath'],
+    'xbmcdrm': [],
+}
+
+def _translate_path(path):
+    if path.startswith('special://'):
+        path = os.path.join(TEMP, path[len('special://'):])
+    return path
+
+def _addon_info(key):
+    return {
+        'id': 'script.module.slyguy',
+        'version': '0.0.0',
+        'name': 'SlyGuy',
+        'path': SLYGUY,
+        'profile': 'special://profile/addon_data/script.module.slyguy/',
+    }.get(key, '')
+
+def _install():
+    for name in KODI_API:
+        module = types.ModuleType(name)
+        module.__all__ = list(KODI_API[name])
+        for attr in KODI_API[name]:
+            setattr(module, attr, mock.MagicMock(name='{}.{}'.format(name, attr)))
+        sys.modules[name] = module
+
+    for name in ('LOGNONE', 'LOGDEBUG', 'LOGINFO', 'LOGWARNING', 'LOGERROR', 'LOGFATAL'):
+        setattr(sys.modules['xbmc'], name, KODI_API['xbmc'].index(name))
+
+    sys.modules['xbmc'].translatePath = _translate_path
+    sys.modules['xbmcvfs'].translatePath = _translate_path
+    sys.modules['xbmc'].getInfoLabel = lambda label: '19.0' if label == 'System.BuildVersion' else ''
+    sys.modules['xbmc'].getCondVisibility = lambda condition: False
+    sys.modules['xbmcaddon'].Addon.return_value.getAddonInfo.side_effect = _addon_info
+    sys.modules['xbmcaddon'].Addon.return_value.getSetting.return_value = ''
+
+    sys.path.insert(0, os.path.join(SLYGUY, 'resources', 'modules'))
+    sys.path.insert(0, SLYGUY)
+
+_install()
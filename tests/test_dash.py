@@ -0,0 +1,76 @@
+import pytest
+
+from resources.lib import proxy
+
+## DashRewriter (proxy._parse_dash_fast) must give the same manifest as the minidom rewrite it replaced
+
+MANIFEST_URL = 'http://cdn.example.com/live/manifest.mpd'
+SUBTITLES = [['text/vtt', 'en', 'http://cdn.example.com/subs/en.vtt'], ['application/ttml+xml', 'fr', 'http://cdn.example.com/subs/fr.xml']]
+
+REPRESENTATIONS = (
+    ('audio/mp4', 'en', 96000, 'mp4a.40.2'),
+    ('video/mp4', '', 5000000, 'avc1.640028'),
+    ('audio/mp4', 'fr', 128000, 'ec-3'),
+    ('video/mp4', '', 3000000, 'hvc1.2.4.L120.90'),
+)
+
+def _sample_mpd(dynamic):
+    lines = [
+        u'<?xml version="1.0" encoding="utf-8"?>',
+        u'<!-- sample -->',
+        u'<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" xmlns:cenc="urn:mpeg:cenc:2013" type="{}" publishTime="2020-01-01T00:00:00Z" minBufferTime="PT2S">'.format('dynamic' if dynamic else 'static'),
+        u'<BaseURL>http://cdn.example.com/live/</BaseURL>',
+        u'<BaseURL>http://backup.example.com/live/</BaseURL>',
+    ]
+
+    for period in range(2):
+        lines.append(u'<Period id="p{0}" start="PT{0}S">'.format(period))
+        lines.append(u'<BaseURL>dash</BaseURL>')
+
+        for idx, (mime, lang, bandwidth, codecs) in enumerate(REPRESENTATIONS):
+            lines.append(u'<AdaptationSet id="{}" mimeType="{}" lang="{}">'.format(idx, mime, lang))
+            lines.append(u'<Role schemeIdUri="urn:mpeg:dash:role:2011" value="main"/>')
+            lines.append(u'<ContentProtection schemeIdUri="urn:mpeg:dash:mp4protection:2011" cenc:default_KID="00000000-0000-0000-0000-000000000000"><cenc:pssh>AAAA&amp;</cenc:pssh></ContentProtection>')
+            for rep in range(2):
+                lines.append(u'<Representation id="r{0}_{1}" bandwidth="{2}" width="{3}" height="{4}" codecs="{5}" frameRate="25/1"/>'.format(
+                    idx, rep, bandwidth + rep * 1000, 1280 + rep * 640, 720 + rep * 360, codecs))
+            lines.append(u'<SegmentTemplate presentationTimeOffset="10" timescale="90000" media="$RepresentationID$/$Time$.m4s" initialization="$RepresentationID$/init.mp4">')
+            lines.append(u'<SegmentTimeline><S t="0" d="180000" r="4"/></SegmentTimeline>')
+            lines.append(u'</SegmentTemplate>')
+            lines.append(u'</AdaptationSet>')
+
+        lines.append(u'<AdaptationSet id="trick" mimeType="video/mp4"><Representation id="t" maxPlayoutRate="4" bandwidth="1"/></AdaptationSet>')
+        lines.append(u'</Period>')
+
+    lines.append(u'</MPD>')
+    return u'\n'.join(lines)
+
+def _rewrite(method, data, selected):
+    handler = proxy.RequestHandler.__new__(proxy.RequestHandler)
+    handler._session = {'default_language': 'fr', 'subtitles': SUBTITLES}
+    handler._streams = []
+
+    def quality_select(streams):
+        handler._streams = [(x['id'], x['bandwidth'], x['resolution'], x['frame_rate'], x['codecs']) for x in streams]
+        return streams[selected] if selected is not None else None
+    handler._quality_select = quality_select
+
+    response = proxy.Response()
+    response.headers = {}
+    response.url = MANIFEST_URL
+    response.stream = proxy.ResponseStream(response)
+
+    getattr(handler, method)(response, data)
+    return response.stream.content, handler._streams
+
+@pytest.mark.parametrize('dynamic', [True, False])
+@pytest.mark.parametrize('selected', [None, 0, 2])
+def test_fast_matches_minidom(dynamic, selected):
+    data = _sample_mpd(dynamic)
+
+    fast, fast_streams = _rewrite('_parse_dash_fast', data, selected)
+    slow, slow_streams = _rewrite('_parse_dash_minidom', data, selected)
+
+    assert fast_streams == slow_streams
+    assert fast == slow
+    assert proxy.PROXY_PATH.encode('utf8') in fast